@@ -1,8 +1,47 @@
-# flake8: noqa F403, F401
-from expressive.single import _, e, is_possible_expression, Const
-from expressive.delayed import *
+# flake8: noqa F401
+from expressive.single import _, e, is_possible_expression, Const, optimize, impure, pure, StructuralKey, \
+    InternTable
 from expressive._version import __version__
 
-from expressive.delayed import __all__ as delayed_all
+# the delayed builtins and async evaluation are imported on first use, to keep importing expressive fast, so this is a
+# copy of expressive.delayed.__all__ (test_import checks that they are equal)
+_delayed_all = [
+    'Abs', 'All', 'And', 'Any', 'Ascii',
+    'Bin', 'Bool', 'ByteArray', 'Bytes',
+    'Callable', 'Ceil', 'Chr', 'Coalesce', 'Complex',
+    'Dict', 'Dir', 'DivMod',
+    'Enumerate', 'Eval',
+    'Filter', 'Float', 'Floor', 'Format', 'FrozenSet',
+    'GetAttr',
+    'HasAttr', 'Hash', 'Hex',
+    'Id', 'If', 'In', 'Index', 'Int', 'Is', 'IsInstance', 'IsSubclass', 'Iter',
+    'Len', 'LengthHint', 'List',
+    'Map', 'Max', 'Memo', 'MemoryView', 'Min',
+    'Next', 'Not',
+    'Oct', 'Open', 'Or', 'Ord',
+    'Pow', 'Print',
+    'Range', 'Repr', 'Reversed',
+    'Round',
+    'Set', 'SetAttr', 'Slice', 'Sorted', 'Str', 'Sum',
+    'Trunc', 'Tuple', 'Type',
+    'Vars',
+    'Zip'
+]
+_lazy_modules = {'ae': 'expressive.asynchronous', **dict.fromkeys(_delayed_all, 'expressive.delayed')}
 
-__all__ = ['__version__', '_', 'e', 'is_possible_expression', 'Const', *delayed_all]
+__all__ = ['__version__', '_', 'e', 'ae', 'is_possible_expression', 'Const', 'optimize', 'impure', 'pure',
+           'StructuralKey', 'InternTable', *_delayed_all]
+
+
+def __getattr__(name):
+    module_name = _lazy_modules.get(name)
+    if module_name is None:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    from importlib import import_module
+    value = getattr(import_module(module_name), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted({*globals(), *_lazy_modules})
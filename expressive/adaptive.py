@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+from expressive.single import Call, Const, _Compiler, _Evaluated, _Parameter, _SubexpressionCounter, _interpret, \
+    _map_, e, is_expression, optimize
+from expressive.delayed import If
+
+__all__ = ['adaptive']
+
+
+def _is_class_info(value) -> bool:
+    # whether isinstance of the value is decided by the type of the instance alone
+    if type(value) is tuple:
+        return all(map(_is_class_info, value))
+    return type(value) is type
+
+
+def _specialize(value, param_type: type):
+    # replaces the type checks of the parameter with their results for a parameter of param_type, and the conditionals
+    # on them with their chosen branches
+    if not is_expression(value):
+        return _map_(value, lambda operand: _specialize(operand, param_type))
+    if type(value) is Call:
+        _, op, args, kwargs = value.__reduce__()[1]
+        if not kwargs and args and type(args[0]) is _Parameter and type(op) is Const:
+            func = op._evaluate(None)
+            if func is type and len(args) == 1:
+                return Const(param_type)
+            if func is isinstance and len(args) == 2:
+                class_info = args[1]._evaluate(None) if type(args[1]) is Const else args[1]
+                if _is_class_info(class_info):
+                    return Const(issubclass(param_type, class_info))
+    value = value._map(lambda operand: _specialize(operand, param_type))
+    if type(value) is If:
+        then, condition, otherwise = value.__reduce__()[1]
+        if type(condition) is Const and type(condition._evaluate(None)) is bool:
+            # only the branch that a folded type check chooses is kept
+            return then if condition._evaluate(None) else otherwise
+    return value
+
+
+class _GuardCompiler(_Compiler):
+    # compiles a specialized expression into a function that first checks the type of its argument
+    def guarded(self, spe, guard: type):
+        guard_name = self.const(guard)
+        ret = self.operand(spe)
+        lines = [f'def __call__(self, {self.param}):',
+                 f'    if type({self.param}) is not {guard_name}:',
+                 f'        return self._miss({self.param})']
+        lines.extend('    ' + s for s in self.statements)
+        lines.append('    return ' + ret)
+        source = '\n'.join(lines) + '\n'
+        exec(compile(source, '<expressive>', 'exec'), self.namespace)
+        return self.namespace['__call__']
+
+
+class _Adaptive(_Evaluated):
+    """
+    Interprets the first calls while recording the types of their arguments. If all of them were of the same type,
+    the expression is then specialized for that type (its type checks of the parameter are folded), and compiled
+    behind a guard checking the type of the argument. Arguments of other types are interpreted, and too many of them
+    deoptimize the expression to a compiled expression that is not specialized. If the recorded arguments were of
+    several types, that expression is compiled right away.
+    """
+
+    def __init__(self, spe, warmup_calls: int, max_guard_misses: int):
+        self.spe = spe
+        self.warmup_calls = warmup_calls
+        self.max_guard_misses = max_guard_misses
+        self.specialized = None
+        self._generic = _interpret(spe)
+        self._compiled = None
+        self._calls = 0
+        self._types = set()
+        self._misses = 0
+
+    @property
+    def tier(self) -> str:
+        if self.specialized is not None:
+            return 'specialized'
+        if self._compiled is not None:
+            return 'compiled'
+        return 'interpreted'
+
+    def __call__(self, v):
+        # specialized functions replace this method with the generated function
+        compiled = self._compiled
+        if compiled is not None:
+            return compiled(v)
+        self._types.add(type(v))
+        self._calls += 1
+        if self._calls >= self.warmup_calls:
+            self._tier_up()
+        return self._generic(v)
+
+    def _tier_up(self):
+        if len(self._types) == 1:
+            param_type, = self._types
+            try:
+                specialized = optimize(_specialize(self.spe, param_type))
+                func = _GuardCompiler(_SubexpressionCounter().shared(specialized)).guarded(specialized, param_type)
+            except (SyntaxError, RecursionError, MemoryError):
+                # the expression is too deep to be specialized
+                pass
+            else:
+                self.specialized = specialized
+                self.__class__ = type(_Adaptive.__name__, (_Adaptive,), {'__call__': func})
+                return
+        self._compiled = e(self.spe, compile=True)
+
+    def _miss(self, v):
+        self._misses += 1
+        if self._misses >= self.max_guard_misses:
+            # the argument type is not stable after all
+            self.specialized = None
+            self._compiled = e(self.spe, compile=True)
+            self.__class__ = _Adaptive
+        return self._generic(v)
+
+    def __repr__(self):
+        return f'e({self.spe!r}, adaptive=True)'
+
+    def __reduce__(self):
+        return adaptive, (self.spe, self.warmup_calls, self.max_guard_misses)
+
+
+def adaptive(spe, warmup_calls=100, max_guard_misses=100) -> _Evaluated:
+    """
+    Finalize an expression into a function that interprets its first warmup_calls calls, and then compiles it,
+    specialized for the type of the argument if all of those calls had arguments of the same type. The specialized
+    function interprets arguments of other types, and after max_guard_misses of them, is replaced by a function
+    compiled for any type. The tier attribute of the function is either 'interpreted', 'specialized' or 'compiled'.
+    """
+    if warmup_calls < 1 or max_guard_misses < 1:
+        raise ValueError('warmup_calls and max_guard_misses must be positive')
+    return _Adaptive(spe, warmup_calls, max_guard_misses)
@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+from asyncio import gather
+from inspect import isawaitable
+from typing import Awaitable, Callable, Tuple
+
+from expressive.single import is_expression, _is_constant, _literal_parts, _unfinalized, _Instruction, _Label, _PUSH, \
+    _PARAM, _APPLY, _JUMP_IF_FALSE, _JUMP, _JUMP_IF_FALSE_OR_POP, _JUMP_IF_TRUE_OR_POP, _jump_opcodes
+
+__all__ = ['ae']
+
+# a prepared value is an async function of the parameter, and whether the value depends on it at all
+_Prepared = Tuple[Callable[[object], Awaitable], bool]
+
+
+async def _resolve(value):
+    # await a result, if it is awaitable
+    while isawaitable(value):
+        value = await value
+    return value
+
+
+async def _evaluate_all(prepared: list, v) -> list:
+    # evaluate operands, concurrently if more than one of them depends on the parameter
+    if sum(dynamic for (_, dynamic) in prepared) > 1:
+        return list(await gather(*(func(v) for (func, _) in prepared)))
+    return [await func(v) for (func, _) in prepared]
+
+
+def _constant(value) -> _Prepared:
+    async def ret(v):
+        return value
+
+    return ret, False
+
+
+async def _parameter(v):
+    return v
+
+
+def _prepare(value) -> _Prepared:
+    if is_expression(value):
+        return _prepare_postfix(value._postfix())
+    parts = _literal_parts(value)
+    if parts is None:
+        return _constant(value)
+    elements, build = parts
+    if _is_constant(value):
+        return _constant(value)
+    # the literal holds expressions, even if none of them depends on the parameter
+    prepared = [_prepare(element) for element in elements]
+
+    async def ret(v):
+        return build(await _evaluate_all(prepared, v))
+
+    return ret, any(dynamic for (_, dynamic) in prepared)
+
+
+def _prepare_postfix(items: list) -> _Prepared:
+    if len(items) == 1 and isinstance(items[0], _Instruction):
+        instruction, = items
+        if instruction.opcode == _PUSH:
+            return _constant(instruction.arg)
+        if instruction.opcode == _PARAM:
+            return _parameter, True
+    if isinstance(items[-1], _Instruction) and items[-1].opcode == _APPLY \
+            and not any(isinstance(item, (_Instruction, _Label)) for item in items[:-1]):
+        # a node with no conditional operands, all its operands can be evaluated concurrently
+        func = items[-1].arg
+        prepared = [_prepare(item) for item in items[:-1]]
+
+        async def ret(v):
+            return await _resolve(func(*(await _evaluate_all(prepared, v))))
+
+        return ret, True
+    return _prepare_program(items), True
+
+
+def _prepare_program(items: list):
+    # a node with control flow, run its postfix items in order
+    steps = []
+    labels = {}
+    for item in items:
+        if isinstance(item, _Label):
+            labels[item] = len(steps)
+        elif isinstance(item, _Instruction):
+            steps.append((item.opcode, item.arg, item.n))
+        else:
+            steps.append((None, _prepare(item)[0], 0))
+    steps = [(opcode, labels[arg] if opcode in _jump_opcodes else arg, n) for (opcode, arg, n) in steps]
+
+    async def ret(v):
+        stack = []
+        pc = 0
+        while pc < len(steps):
+            opcode, arg, n = steps[pc]
+            pc += 1
+            if opcode is None:
+                stack.append(await arg(v))
+            elif opcode == _PUSH:
+                stack.append(arg)
+            elif opcode == _PARAM:
+                stack.append(v)
+            elif opcode == _APPLY:
+                args = stack[len(stack) - n:]
+                del stack[len(stack) - n:]
+                stack.append(await _resolve(arg(*args)))
+            elif opcode == _JUMP_IF_FALSE:
+                if not stack.pop():
+                    pc = arg
+            elif opcode == _JUMP:
+                pc = arg
+            elif opcode == _JUMP_IF_FALSE_OR_POP:
+                if stack[-1]:
+                    stack.pop()
+                else:
+                    pc = arg
+            elif opcode == _JUMP_IF_TRUE_OR_POP:
+                if stack[-1]:
+                    pc = arg
+                else:
+                    stack.pop()
+            elif stack[-1] is None:  # _JUMP_IF_NOT_NONE_OR_POP
+                stack.pop()
+            else:
+                pc = arg
+        return stack[-1]
+
+    return ret
+
+
+class _AsyncEvaluated:
+    def __init__(self, spe):
+        self.spe = spe
+        self._func, _ = _prepare(spe)
+
+    def __call__(self, v) -> Awaitable:
+        return self._func(v)
+
+    def __repr__(self):
+        return f'ae({self.spe!r})'
+
+
+def ae(spe):
+    """
+    Finalize an expression into an asynchronous function. Awaitable results of the expression's parts (such as calls
+    to coroutine functions) are awaited, and the operands of a single call or operator are evaluated concurrently.
+    """
+    if isinstance(spe, _AsyncEvaluated):
+        return spe
+    return _AsyncEvaluated(_unfinalized(spe))
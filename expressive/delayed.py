@@ -1,12 +1,19 @@
+from abc import abstractmethod
+from collections import OrderedDict, namedtuple
 from math import floor, ceil, trunc
 from operator import pow, not_, abs, index, length_hint, is_
+from threading import RLock
+from time import monotonic
+from typing import Optional
 
-from expressive.single import Const, evaluate, SingleParamExpression, _eq_
+from expressive.single import Const, evaluate, SingleParamExpression, _eq_, _hash_, _map_by_element, _Compiler, \
+    _Instruction, _Label, _JUMP, _JUMP_IF_FALSE, _JUMP_IF_FALSE_OR_POP, _JUMP_IF_TRUE_OR_POP, \
+    _JUMP_IF_NOT_NONE_OR_POP, named_constant, is_expression, _Parameter, pure
 
 __all__ = [
-    'Abs', 'All', 'Any', 'Ascii',
+    'Abs', 'All', 'And', 'Any', 'Ascii',
     'Bin', 'Bool', 'ByteArray', 'Bytes',
-    'Callable', 'Ceil', 'Chr', 'Complex',
+    'Callable', 'Ceil', 'Chr', 'Coalesce', 'Complex',
     'Dict', 'Dir', 'DivMod',
     'Enumerate', 'Eval',
     'Filter', 'Float', 'Floor', 'Format', 'FrozenSet',
@@ -14,9 +21,9 @@ __all__ = [
     'HasAttr', 'Hash', 'Hex',
     'Id', 'If', 'In', 'Index', 'Int', 'Is', 'IsInstance', 'IsSubclass', 'Iter',
     'Len', 'LengthHint', 'List',
-    'Map', 'Max', 'MemoryView', 'Min',
+    'Map', 'Max', 'Memo', 'MemoryView', 'Min',
     'Next', 'Not',
-    'Oct', 'Open', 'Ord',
+    'Oct', 'Open', 'Or', 'Ord',
     'Pow', 'Print',
     'Range', 'Repr', 'Reversed',
     'Round',
@@ -26,6 +33,12 @@ __all__ = [
     'Zip'
 ]
 
+
+@pure
+def _in(a, b):
+    return a in b
+
+
 Abs = abs
 All = Const(all, 'All')
 Any = Const(any, 'Any')
@@ -53,7 +66,7 @@ HasAttr = Const(hasattr, 'HasAttr')
 Hash = Const(hash, 'Hash')
 Hex = Const(hex, 'Hex')
 Id = Const(id, 'Id')
-In = Const(lambda a, b: a in b, 'In')
+In = Const(_in, 'In')
 Index = Const(index, 'Index')
 Int = Const(int, 'Int')
 Is = Const(is_, 'Is')
@@ -90,6 +103,10 @@ Type = Const(type, 'Type')
 Vars = Const(vars, 'Vars')
 Zip = Const(zip, 'Zip')
 
+# serialize the delayed builtins by their names
+for _constant in [c for c in globals().values() if type(c) is Const]:
+    named_constant(_constant)
+
 
 class If(SingleParamExpression):
     def __init__(self, then, condition, otherwise):
@@ -108,5 +125,249 @@ class If(SingleParamExpression):
                and _eq_(self.__then, other.__then) \
                and _eq_(self.__otherwise, other.__otherwise)
 
+    def _calc_hash(self) -> int:
+        return hash((type(self), _hash_(self.__then), _hash_(self.__condition), _hash_(self.__otherwise)))
+
     def __repr__(self):
         return f'If({self.__then!r}, {self.__condition!r}, {self.__otherwise!r})'
+
+    def __reduce__(self):
+        return type(self), (self.__then, self.__condition, self.__otherwise)
+
+    def _compile(self, compiler: _Compiler) -> str:
+        return compiler.conditional(self.__then, self.__condition, self.__otherwise)
+
+    def _postfix(self) -> list:
+        otherwise = _Label()
+        end = _Label()
+        return [self.__condition, _Instruction(_JUMP_IF_FALSE, otherwise),
+                self.__then, _Instruction(_JUMP, end),
+                otherwise, self.__otherwise,
+                end]
+
+    def _map(self, func):
+        args = _map_by_element((self.__then, self.__condition, self.__otherwise), func)
+        return type(self)(*args) if args else self
+
+
+class _ShortCircuit(SingleParamExpression):
+    # evaluates its operands in order, stopping at the first one that decides the result
+    _name: str
+    _jump_opcode: int
+
+    def __init__(self, *operands):
+        if len(operands) < 2:
+            raise TypeError(f'{type(self).__name__} requires at least 2 operands')
+        self.__operands = operands
+
+    @staticmethod
+    @abstractmethod
+    def _decides(value) -> bool:
+        pass
+
+    @abstractmethod
+    def _compile_operands(self, compiler: _Compiler, operands: tuple) -> str:
+        pass
+
+    def _compile(self, compiler: _Compiler) -> str:
+        return self._compile_operands(compiler, self.__operands)
+
+    def _evaluate(self, v):
+        for operand in self.__operands:
+            value = evaluate(operand, v)
+            if self._decides(value):
+                return value
+        return value
+
+    def _eq(self, other) -> bool:
+        return type(self) is type(other) \
+               and len(self.__operands) == len(other.__operands) \
+               and all(_eq_(s, o) for (s, o) in zip(self.__operands, other.__operands))
+
+    def _calc_hash(self) -> int:
+        return hash((type(self), *(_hash_(o) for o in self.__operands)))
+
+    def __repr__(self):
+        return self._name + '(' + ', '.join(repr(o) for o in self.__operands) + ')'
+
+    def __reduce__(self):
+        return type(self), self.__operands
+
+    def _postfix(self) -> list:
+        end = _Label()
+        ret = []
+        for operand in self.__operands[:-1]:
+            ret.extend((operand, _Instruction(self._jump_opcode, end)))
+        ret.extend((self.__operands[-1], end))
+        return ret
+
+    def _map(self, func):
+        args = _map_by_element(self.__operands, func)
+        return type(self)(*args) if args else self
+
+
+class And(_ShortCircuit):
+    """
+    Evaluates to the first falsish operand (or the last operand), without evaluating the operands after it.
+    """
+    _name = 'And'
+    _jump_opcode = _JUMP_IF_FALSE_OR_POP
+
+    @staticmethod
+    def _decides(value) -> bool:
+        return not value
+
+    def _compile_operands(self, compiler: _Compiler, operands: tuple) -> str:
+        return compiler.short_circuit('and', operands)
+
+
+class Or(_ShortCircuit):
+    """
+    Evaluates to the first truthy operand (or the last operand), without evaluating the operands after it.
+    """
+    _name = 'Or'
+    _jump_opcode = _JUMP_IF_TRUE_OR_POP
+
+    @staticmethod
+    def _decides(value) -> bool:
+        return bool(value)
+
+    def _compile_operands(self, compiler: _Compiler, operands: tuple) -> str:
+        return compiler.short_circuit('or', operands)
+
+
+class Coalesce(_ShortCircuit):
+    """
+    Evaluates to the first operand that is not None (or None), without evaluating the operands after it.
+    """
+    _name = 'Coalesce'
+    _jump_opcode = _JUMP_IF_NOT_NONE_OR_POP
+
+    @staticmethod
+    def _decides(value) -> bool:
+        return value is not None
+
+    def _compile_operands(self, compiler: _Compiler, operands: tuple) -> str:
+        return compiler.coalesce(operands)
+
+
+MemoInfo = namedtuple('MemoInfo', ('hits', 'misses', 'evictions', 'expirations', 'maxsize', 'currsize'))
+
+
+class _MemoCache:
+    # a thread-safe LRU cache with expiration, shared by a Memo and the copies made of it when finalizing or optimizing
+    def __init__(self, maxsize: Optional[int], ttl: Optional[float], timer):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.timer = timer
+        self.lock = RLock()
+        self.entries = OrderedDict()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def get(self, key):
+        # the cached value and True, or None and False
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires is None or self.timer() < expires:
+                    self.hits += 1
+                    self.entries.move_to_end(key)
+                    return value, True
+                del self.entries[key]
+                self.expirations += 1
+            self.misses += 1
+            return None, False
+
+    def put(self, key, value):
+        expires = None if self.ttl is None else self.timer() + self.ttl
+        with self.lock:
+            self.entries[key] = (value, expires)
+            self.entries.move_to_end(key)
+            if self.maxsize is not None and len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def info(self) -> MemoInfo:
+        with self.lock:
+            return MemoInfo(self.hits, self.misses, self.evictions, self.expirations, self.maxsize, len(self.entries))
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = self.evictions = self.expirations = 0
+
+
+class Memo(SingleParamExpression):
+    """
+    Caches the value of a subexpression, keyed on the values of its operands (for example, the arguments of a call), or
+    on the parameter itself if the subexpression is conditional. Keeps at most maxsize values, evicting the least
+    recently used, and recomputes values older than ttl seconds.
+    """
+
+    def __init__(self, subexpr, maxsize: Optional[int] = 128, ttl: Optional[float] = None, *, timer=monotonic):
+        self.__subexpr = subexpr
+        self.__by_parameter = not is_expression(subexpr) or isinstance(subexpr, (If, _ShortCircuit, _Parameter))
+        self.__cache = _MemoCache(maxsize, ttl, timer)
+
+    def __key(self, v):
+        if self.__by_parameter:
+            return v, None
+        values = []
+
+        def collect(operand):
+            values.append(evaluate(operand, v))
+            return operand
+
+        self.__subexpr._map(collect)
+        return tuple(values), values
+
+    def __compute(self, v, values):
+        if values is None:
+            return evaluate(self.__subexpr, v)
+        values = iter(values)
+        return self.__subexpr._map(lambda operand: Const(next(values)))._evaluate(v)
+
+    def _evaluate(self, v):
+        key, values = self.__key(v)
+        value, found = self.__cache.get(key)
+        if not found:
+            value = self.__compute(v, values)
+            self.__cache.put(key, value)
+        return value
+
+    def cache_info(self) -> MemoInfo:
+        return self.__cache.info()
+
+    def cache_clear(self):
+        self.__cache.clear()
+
+    def _eq(self, other) -> bool:
+        # every memo has its own cache
+        return type(self) is type(other) and self.__cache is other.__cache
+
+    def _calc_hash(self) -> int:
+        return id(self.__cache)
+
+    def _pure(self) -> bool:
+        return False
+
+    def __repr__(self):
+        ret = f'Memo({self.__subexpr!r}, maxsize={self.__cache.maxsize!r}'
+        if self.__cache.ttl is not None:
+            ret += f', ttl={self.__cache.ttl!r}'
+        return ret + ')'
+
+    def __reduce__(self):
+        # the cache is not kept
+        return type(self), (self.__subexpr, self.__cache.maxsize, self.__cache.ttl)
+
+    def _map(self, func):
+        subexpr = func(self.__subexpr)
+        if subexpr is self.__subexpr:
+            return self
+        ret = type(self)(subexpr)
+        ret.__cache = self.__cache
+        # a conditional subexpression stays keyed on the parameter when it is wrapped (for example, to be profiled)
+        ret.__by_parameter = ret.__by_parameter or self.__by_parameter
+        return ret
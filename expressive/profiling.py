@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+from time import perf_counter
+from typing import Dict, List
+
+from expressive.single import SingleParamExpression, Const, _Parameter, _Evaluated, _finalize_operand, _map_, \
+    is_expression
+
+__all__ = ['NodeStats', 'Profile', 'profiled']
+
+
+class NodeStats:
+    """
+    The number of evaluations of a node, and the total time they took, with and without the time of its operands.
+    """
+
+    def __init__(self, expression: str):
+        self.expression = expression
+        self.calls = 0
+        self.total = 0.0
+        self.own = 0.0
+        self.children: List[NodeStats] = []
+
+    def __repr__(self):
+        return f'NodeStats({self.expression!r}, calls={self.calls}, total={self.total:.6f}, own={self.own:.6f})'
+
+    def walk(self, depth=0):
+        yield depth, self
+        for child in self.children:
+            yield from child.walk(depth + 1)
+
+
+class Profile:
+    """
+    The evaluation statistics of every node of a profiled expression, in the shape of the expression.
+    """
+
+    def __init__(self, root: NodeStats):
+        self.root = root
+        # the time spent evaluating the operands of the node being evaluated
+        self._operands_time = 0.0
+
+    def by_expression(self) -> Dict[str, NodeStats]:
+        """
+        The statistics summed over all the nodes with the same repr.
+        """
+        ret = {}
+        for _, node in self.root.walk():
+            summed = ret.get(node.expression)
+            if summed is None:
+                summed = ret[node.expression] = NodeStats(node.expression)
+            summed.calls += node.calls
+            summed.total += node.total
+            summed.own += node.own
+        return ret
+
+    def report(self, min_fraction=0.0) -> str:
+        """
+        A tree of the nodes with their calls, total and own time in milliseconds, and share of the total time,
+        skipping the nodes that took less than min_fraction of it.
+        """
+        overall = self.root.total or 1.0
+        lines = [f'{"calls":>10} {"total ms":>10} {"own ms":>10} {"%":>6}  expression']
+        for depth, node in self.root.walk():
+            if node.total / overall < min_fraction:
+                continue
+            lines.append(f'{node.calls:>10} {node.total * 1000:>10.3f} {node.own * 1000:>10.3f} '
+                         f'{node.total / overall * 100:>6.1f}  {"  " * depth}{node.expression}')
+        return '\n'.join(lines)
+
+    def reset(self):
+        for _, node in self.root.walk():
+            node.calls = 0
+            node.total = node.own = 0.0
+
+    def __str__(self):
+        return self.report()
+
+
+class _Timed(SingleParamExpression):
+    # evaluates a node (whose operands are timed as well) and records how long it took
+    def __init__(self, node: SingleParamExpression, stats: NodeStats, profile: Profile):
+        self.__node = node
+        self.__stats = stats
+        self.__profile = profile
+
+    def _evaluate(self, v):
+        profile = self.__profile
+        outer_operands_time = profile._operands_time
+        profile._operands_time = 0.0
+        start = perf_counter()
+        try:
+            return self.__node._evaluate(v)
+        finally:
+            elapsed = perf_counter() - start
+            stats = self.__stats
+            stats.calls += 1
+            stats.total += elapsed
+            stats.own += elapsed - profile._operands_time
+            profile._operands_time = outer_operands_time + elapsed
+
+    def _eq(self, other) -> bool:
+        return self is other
+
+    def _calc_hash(self) -> int:
+        return id(self)
+
+    def _map(self, func):
+        # the operands are mapped through the timed node (Memo keys on them), and the result is timed the same way
+        node = self.__node._map(func)
+        if node is self.__node:
+            return self
+        return _Timed(node, self.__stats, self.__profile)
+
+    def _pure(self) -> bool:
+        return False
+
+    def __repr__(self):
+        return repr(self.__node)
+
+
+def _instrument(value, parent: NodeStats, profile: Profile):
+    if not is_expression(value):
+        # time the expressions in container literals
+        return _map_(value, lambda operand: _instrument(operand, parent, profile))
+    if isinstance(value, (Const, _Parameter)):
+        return value
+    stats = NodeStats(repr(value))
+    parent.children.append(stats)
+    node = value._map(lambda operand: _instrument(operand, stats, profile))
+    return _Timed(node, stats, profile)
+
+
+class _Profiled(_Evaluated):
+    def __init__(self, spe):
+        self.spe = spe
+        root = NodeStats(repr(spe))
+        self.profile = Profile(root)
+        finalized = _instrument(spe, root, self.profile)
+        if isinstance(finalized, _Timed):
+            self.profile.root, = root.children
+        else:
+            # time the whole literal (or constant) as well
+            finalized = _Timed(_finalize_operand(finalized), root, self.profile)
+        self._finalized = finalized
+
+    def __reduce__(self):
+        return profiled, (self.spe,)
+
+
+def profiled(spe) -> _Evaluated:
+    """
+    Finalize an expression into a function that records the evaluations of each of its nodes, see Profile.
+    """
+    return _Profiled(spe)
@@ -0,0 +1,277 @@
+from __future__ import annotations
+
+from collections.abc import Mapping
+from typing import Dict, Hashable, Iterator, List, Optional, Tuple
+
+from expressive.single import BinOp, Call, Const, GetAttr, GetItem, StructuralKey, _Compiler, _Parameter, \
+    _SubexpressionCounter, _unfinalized, e, is_expression
+from expressive.delayed import And, In
+from expressive.sql import _is_predicate, _parts
+
+__all__ = ['ExpressionSet', 'RuleIndex']
+
+
+class _SetCompiler(_Compiler):
+    """
+    Lowers many expressions to the source of a single function, evaluating each subexpression that they share once.
+    """
+
+    def _sources(self, expressions: tuple) -> List[str]:
+        expressions = tuple(map(_unfinalized, expressions))
+        try:
+            self._shared_names = {StructuralKey(s): None for s in _SubexpressionCounter().shared(expressions)}
+            return [self.operand(spe) for spe in expressions]
+        except RecursionError:
+            # the expressions are too deep to be compiled, call the finalized expressions instead
+            self._shared_names = {}
+            self.statements = []
+            return [self.const(e(spe)) + '(' + self.param + ')' for spe in expressions]
+
+    def _function(self, name: str, lines: List[str]):
+        source = '\n'.join([f'def {name}({self.param}):', *('    ' + s for s in self.statements), *lines]) + '\n'
+        exec(compile(source, '<expressive>', 'exec'), self.namespace)
+        return self.namespace[name]
+
+    def evaluator(self, expressions: tuple):
+        # a function returning the list of the values of the expressions
+        sources = self._sources(expressions)
+        return self._function('_evaluate', ['    return [' + ', '.join(sources) + ']'])
+
+    def matcher(self, ids: tuple, expressions: tuple):
+        # a function returning the list of the ids of the truthy expressions
+        sources = self._sources(expressions)
+        lines = ['    _m = []']
+        for id_, source in zip(ids, sources):
+            lines.append(f'    if {source}:')
+            lines.append(f'        _m.append({self.const(id_)})')
+        lines.append('    return _m')
+        return self._function('_match', lines)
+
+
+class ExpressionSet:
+    """
+    Many expressions, each with an id, that are evaluated together. All the expressions are compiled into a single
+    function, so that every subexpression they share (and that is evaluated unconditionally) is evaluated once per
+    value, instead of once per expression. If evaluating any of the expressions raises an exception, the whole
+    evaluation raises it.
+    """
+
+    def __init__(self, expressions=()):
+        """
+        expressions is either a mapping of ids to expressions, or an iterable of expressions, whose ids are their
+        indices.
+        """
+        if not isinstance(expressions, Mapping):
+            expressions = dict(enumerate(expressions))
+        self._expressions: Dict[Hashable, object] = dict(expressions)
+        self._evaluator = self._matcher = None
+
+    def add(self, id_: Hashable, expression):
+        self._expressions[id_] = expression
+        self._evaluator = self._matcher = None
+
+    def remove(self, id_: Hashable):
+        del self._expressions[id_]
+        self._evaluator = self._matcher = None
+
+    def __getitem__(self, id_: Hashable):
+        return self._expressions[id_]
+
+    def __contains__(self, id_):
+        return id_ in self._expressions
+
+    def __iter__(self) -> Iterator:
+        return iter(self._expressions)
+
+    def __len__(self):
+        return len(self._expressions)
+
+    def evaluate(self, v) -> dict:
+        """
+        The values of all the expressions for v, by their ids.
+        """
+        if self._evaluator is None:
+            self._evaluator = _SetCompiler().evaluator(tuple(self._expressions.values()))
+        return dict(zip(self._expressions, self._evaluator(v)))
+
+    def matches(self, v) -> list:
+        """
+        The ids of the expressions whose values are truthy for v, in the order they were added.
+        """
+        if self._matcher is None:
+            self._matcher = _SetCompiler().matcher(tuple(self._expressions), tuple(self._expressions.values()))
+        return self._matcher(v)
+
+    def __repr__(self):
+        return f'ExpressionSet({self._expressions!r})'
+
+
+def _conjuncts(rule, unconditional=True) -> List[Tuple[object, bool]]:
+    # the conjuncts of a rule, and whether each of them is evaluated whenever the rule is
+    if type(rule) is And:
+        first, *rest = _parts(rule)
+        return _conjuncts(first, unconditional) + [c for operand in rest for c in _conjuncts(operand, False)]
+    if type(rule) is BinOp:
+        op_str, _, lhs, rhs = _parts(rule)
+        if op_str == '&' and _is_predicate(lhs) and _is_predicate(rhs):
+            return _conjuncts(lhs, unconditional) + _conjuncts(rhs, unconditional)
+    return [(rule, unconditional)]
+
+
+def _is_path(v) -> bool:
+    # whether an expression is the parameter, or a chain of constant attributes and items of it
+    while type(v) in (GetAttr, GetItem):
+        v, name = _parts(v)
+        if is_expression(name) and type(name) is not Const:
+            return False
+    return type(v) is _Parameter
+
+
+def _constant(v):
+    if type(v) is Const:
+        return v._evaluate(None)
+    return v
+
+
+def _hashable(v) -> bool:
+    try:
+        hash(v)
+    except TypeError:
+        return False
+    # nan is not equal to itself, but would be found in the index
+    return v == v
+
+
+def _discriminator(conjunct) -> Optional[Tuple[object, list]]:
+    # the path and the values it must equal one of for the conjunct to be truthy, or None if it is not indexable
+    if type(conjunct) is BinOp:
+        op_str, _, lhs, rhs = _parts(conjunct)
+        if op_str != '==':
+            return None
+        if _is_path(rhs) and not _is_path(lhs):
+            lhs, rhs = rhs, lhs
+        value = _constant(rhs)
+        if _is_path(lhs) and not is_expression(value) and _hashable(value):
+            return lhs, [value]
+    elif type(conjunct) is Call:
+        _, op, args, kwargs = _parts(conjunct)
+        if op is In and not kwargs:
+            item, container = args
+            container = _constant(container)
+            if _is_path(item) and type(container) in (tuple, list, set, frozenset) \
+                    and all(not is_expression(v) and _hashable(v) for v in container):
+                return item, list(container)
+    return None
+
+
+class _PathIndex:
+    # the rules discriminated by the value of a single path, with the rest of each rule's conditions
+    def __init__(self, path):
+        self.path = e(path, compile=True)
+        self.buckets: Dict[object, dict] = {}
+        self.rules = {}
+
+    def add(self, id_, values: list, remaining, rule):
+        for value in values:
+            self.buckets.setdefault(value, {})[id_] = remaining
+        self.rules[id_] = rule
+
+    def build(self):
+        # the remaining conditions of the rules under each value may be indexed as well
+        self.buckets = {value: RuleIndex(remaining) for value, remaining in self.buckets.items()}
+        self.rules = ExpressionSet(self.rules)
+
+    def matches(self, v) -> list:
+        value = self.path(v)
+        try:
+            bucket = self.buckets.get(value)
+        except TypeError:
+            # an unhashable value can still be equal to some of the values, evaluate all the rules
+            return self.rules.matches(v)
+        if bucket is None:
+            return []
+        return bucket.matches(v)
+
+
+class RuleIndex:
+    """
+    Many rules (predicates), each with an id, that are matched together like an ExpressionSet. Rules with a conjunct
+    comparing an attribute or item path of the parameter to a constant (path == constant) or testing its membership
+    in constants (In(path, constants)) are indexed by that path, so matching a value looks up the value of each
+    indexed path once, and only matches the remaining conditions of the rules found under it (which are indexed in
+    turn). Only conjuncts that are evaluated whenever their rule is (for example, not the later operands of And) are
+    indexed.
+    """
+
+    def __init__(self, rules=()):
+        """
+        rules is either a mapping of ids to rules, or an iterable of rules, whose ids are their indices.
+        """
+        if not isinstance(rules, Mapping):
+            rules = dict(enumerate(rules))
+        self._rules: Dict[Hashable, object] = dict(rules)
+        self._indices: Optional[List[_PathIndex]] = None
+        self._unindexed: Optional[ExpressionSet] = None
+        self._order: Dict[Hashable, int] = {}
+
+    def add(self, id_: Hashable, rule):
+        self._rules[id_] = rule
+        self._indices = None
+
+    def remove(self, id_: Hashable):
+        del self._rules[id_]
+        self._indices = None
+
+    def __getitem__(self, id_: Hashable):
+        return self._rules[id_]
+
+    def __contains__(self, id_):
+        return id_ in self._rules
+
+    def __iter__(self) -> Iterator:
+        return iter(self._rules)
+
+    def __len__(self):
+        return len(self._rules)
+
+    def _build(self):
+        indices = {}
+        unindexed = {}
+        for id_, rule in self._rules.items():
+            rule = _unfinalized(rule)
+            conjuncts = _conjuncts(rule)
+            for i, (conjunct, unconditional) in enumerate(conjuncts):
+                discriminator = unconditional and _discriminator(conjunct)
+                if discriminator:
+                    break
+            else:
+                unindexed[id_] = rule
+                continue
+            path, values = discriminator
+            rest = [c for (j, (c, _)) in enumerate(conjuncts) if j != i]
+            remaining = And(*rest) if len(rest) > 1 else (rest[0] if rest else True)
+            key = StructuralKey(path)
+            index = indices.get(key)
+            if index is None:
+                index = indices[key] = _PathIndex(path)
+            index.add(id_, values, remaining, rule)
+        for index in indices.values():
+            index.build()
+        self._indices = list(indices.values())
+        self._unindexed = ExpressionSet(unindexed)
+        self._order = {id_: i for (i, id_) in enumerate(self._rules)}
+
+    def matches(self, v) -> list:
+        """
+        The ids of the rules that are truthy for v, in the order they were added.
+        """
+        if self._indices is None:
+            self._build()
+        ret = self._unindexed.matches(v)
+        for index in self._indices:
+            ret.extend(index.matches(v))
+        ret.sort(key=self._order.__getitem__)
+        return ret
+
+    def __repr__(self):
+        return f'RuleIndex({self._rules!r})'
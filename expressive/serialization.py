@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import builtins
+import json
+import math
+import operator
+import zlib
+from base64 import b64decode, b64encode
+from typing import Callable
+
+from expressive.single import SingleParamExpression, BinOp, UnOp, Call, GetItem, GetAttr, Const, _Evaluated, \
+    _named_constant, _make_call, _finalize, _interpret, _compile_e, _Iterative, _ as _parameter
+from expressive.delayed import If, And, Or, Coalesce, Memo
+
+__all__ = ['register', 'encode', 'decode', 'dumps', 'loads', 'dumpb', 'loadb']
+
+# objects that are serialized by name, name -> object, and id -> name for the reverse lookup
+_objects = {}
+_names = {}
+
+
+def register(obj, name: str = None):
+    """
+    Register an object (usually a function) so that expressions that hold it can be serialized, by name.
+    """
+    if name is None:
+        name = obj.__module__ + '.' + obj.__qualname__
+    if _objects.get(name, obj) is not obj:
+        raise ValueError(f'{name!r} is already registered to another object')
+    _objects[name] = obj
+    _names[id(obj)] = name
+    return obj
+
+
+for _module in (builtins, operator, math):
+    for _name, _obj in vars(_module).items():
+        if not _name.startswith('_') and callable(_obj):
+            register(_obj, _module.__name__ + '.' + _name)
+
+# the only functions that are ever called when decoding, these rebuild the expressions from their operands
+_constructors = {
+    'BinOp': BinOp,
+    'UnOp': UnOp,
+    'Call': _make_call,  # decoded with the Call type, see _encode_node
+    'GetItem': GetItem,
+    'GetAttr': GetAttr,
+    'Const': Const,
+    'Literal': _finalize,
+    'If': If,
+    'And': And,
+    'Or': Or,
+    'Coalesce': Coalesce,
+    'Memo': Memo,
+    'e': _interpret,
+    'compiled': _compile_e,
+    'iterative': _Iterative,
+}
+_constructor_names = {id(v): k for (k, v) in _constructors.items()}
+
+
+def _encode_node(v) -> list:
+    reduced = v.__reduce__()
+    if reduced == '_':
+        return ['_']
+    func, args = reduced
+    if func is _named_constant:
+        return ['c', *args]
+    if func is _make_call and args[0] is Call:
+        return ['n', 'Call', *map(encode, args[1:])]
+    name = _constructor_names.get(id(func))
+    if name is None:
+        raise TypeError(f'cannot serialize {v!r}, {getattr(func, "__name__", func)} is not a known expression type')
+    return ['n', name, *map(encode, args)]
+
+
+def encode(v):
+    """
+    Convert an expression (or a finalized expression) into a json-compatible value, see decode.
+    """
+    if v is None or type(v) in (bool, int, float, str):
+        return v
+    if isinstance(v, (SingleParamExpression, _Evaluated)):
+        return _encode_node(v)
+    name = _names.get(id(v))
+    if name is not None:
+        return ['x', name]
+    if type(v) is tuple:
+        return ['t', *map(encode, v)]
+    if type(v) is list:
+        return ['l', *map(encode, v)]
+    if type(v) is dict:
+        return ['d', *map(encode, (i for item in v.items() for i in item))]
+    if type(v) is set:
+        return ['s', *map(encode, v)]
+    if type(v) is frozenset:
+        return ['f', *map(encode, v)]
+    if type(v) is slice:
+        return ['sl', encode(v.start), encode(v.stop), encode(v.step)]
+    if type(v) is bytes:
+        return ['b', b64encode(v).decode('ascii')]
+    if type(v) is complex:
+        return ['j', v.real, v.imag]
+    raise TypeError(f'cannot serialize {v!r}, register it first')
+
+
+def _decode_node(name: str, *args):
+    if name == 'Call':
+        return _make_call(Call, *args)
+    return _constructors[name](*args)
+
+
+_decoders: dict[str, Callable] = {
+    '_': lambda: _parameter,
+    'c': _named_constant,
+    'x': _objects.__getitem__,
+    't': lambda *items: items,
+    'l': lambda *items: list(items),
+    'd': lambda *items: dict(zip(items[::2], items[1::2])),
+    's': lambda *items: set(items),
+    'f': lambda *items: frozenset(items),
+    'sl': slice,
+    'j': complex,
+}
+
+
+def decode(v):
+    """
+    Rebuild an expression from its encoded form. Only registered objects and expression types are ever looked up,
+    and no function other than the expression constructors is called.
+    """
+    if type(v) is not list:
+        return v
+    tag, *args = v
+    if tag == 'b':
+        return b64decode(args[0])
+    if tag == 'n':
+        name, *args = args
+        if name not in _constructors:
+            raise ValueError(f'unknown expression type {name!r}')
+        return _decode_node(name, *map(decode, args))
+    if tag in ('c', 'x', 'j'):
+        try:
+            return _decoders[tag](*args)
+        except KeyError:
+            raise ValueError(f'unknown name {args[0]!r}') from None
+    try:
+        decoder = _decoders[tag]
+    except KeyError:
+        raise ValueError(f'unknown tag {tag!r}') from None
+    return decoder(*map(decode, args))
+
+
+def dumps(v) -> str:
+    """
+    Serialize an expression to a compact json string.
+    """
+    return json.dumps(encode(v), separators=(',', ':'))
+
+
+def loads(s: str):
+    return decode(json.loads(s))
+
+
+def dumpb(v) -> bytes:
+    """
+    Serialize an expression to compressed bytes.
+    """
+    return zlib.compress(dumps(v).encode('utf-8'))
+
+
+def loadb(b: bytes):
+    return loads(zlib.decompress(b).decode('utf-8'))
@@ -1,26 +1,73 @@
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
-from collections import ChainMap, Counter
-from dataclasses import is_dataclass, fields
-from functools import singledispatch
-from itertools import starmap
-from math import floor, ceil, trunc
+from collections import ChainMap, Counter, OrderedDict, namedtuple
+from collections.abc import Iterable, Collection, Mapping
+from functools import singledispatch, lru_cache, partial
+from itertools import starmap, chain
+from keyword import iskeyword
+from math import copysign, floor, ceil, trunc
+from threading import RLock
 from operator import \
     add, sub, mul, truediv, floordiv, mod, pow, matmul, lshift, rshift, ge, gt, le, lt, eq, ne, or_, and_, xor, \
-    abs, invert, neg, pos
-from textwrap import dedent
+    abs, invert, neg, pos, getitem, attrgetter, itemgetter, methodcaller
 from types import SimpleNamespace
-from typing import Any, Callable, Union, Optional, Iterable, Collection, Mapping
+
+# typing is only needed for annotations, and importing it takes a while
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Any, Callable, Union, Optional
+
+_binary_operators = ((add, '+'),
+                     (sub, '-'),
+                     (mul, '*'),
+                     (truediv, '/'),
+                     (floordiv, '//'),
+                     (mod, '%'),
+                     (pow, '**'),
+                     (matmul, '@'),
+                     (lshift, '<<'),
+                     (rshift, '>>'),
+                     (or_, '|'),
+                     (and_, '&'),
+                     (xor, '^'),)
+
+_comparison_operators = ((ge, '>='),
+                         (gt, '>'),
+                         (le, '<='),
+                         (lt, '<'),
+                         (eq, '=='),
+                         (ne, '!='),)
+
+_unary_operators = ((invert, '~'),
+                    (neg, '-'),
+                    (pos, '+'),)
+
+# operator symbols that can be emitted verbatim when compiling an expression
+_operator_symbols = dict((*_binary_operators, *_comparison_operators, *_unary_operators))
+
+# immutable types that never contain expressions
+_atomic_types = frozenset((type(None), bool, int, float, complex, str, bytes))
+
+
+def _signs(v) -> tuple:
+    # 0.0 and -0.0 are equal, but expressions with them are not interchangeable
+    if type(v) is float:
+        return copysign(1.0, v),
+    return copysign(1.0, v.real), copysign(1.0, v.imag)
 
 
 def _eq_(a, b):
+    if type(a) in _atomic_types:
+        # 1, 1.0 and True are equal, but expressions with them are not interchangeable
+        return type(a) is type(b) and a == b and (type(a) not in (float, complex) or _signs(a) == _signs(b))
     if is_expression(a):
-        return a._eq(b)
+        return a is b or (not _known_different(a, b) and a._eq(b))
     if is_expression(b):
         return b._eq(a)
     if not (is_possible_expression(a) or is_possible_expression(b)):
-        return a == b
+        # 1, 1.0 and True are equal, but expressions with them are not interchangeable
+        return type(a) is type(b) and a == b
     if hasattr(a, '_fields') and hasattr(b, '_fields'):
         return type(a) is type(b) \
                and _eq_(
@@ -37,16 +84,57 @@ def _eq_(a, b):
         return type(a) is type(b) and _eq_(a.args, b.args)
     if isinstance(a, SimpleNamespace) and isinstance(b, SimpleNamespace):
         return type(a) is type(b) and _eq_(a.__dict__, b.__dict__)
-    return a == b
+    return type(a) is type(b) and a == b
+
+
+def _known_different(a: SingleParamExpression, b) -> bool:
+    # whether two expressions are known to be different by their cached structural hashes
+    return is_expression(b) \
+           and a._structural_hash is not None \
+           and b._structural_hash is not None \
+           and a._structural_hash != b._structural_hash
+
+
+def _hash_(v) -> int:
+    # a hash consistent with _eq_
+    if is_expression(v):
+        return v._hash()
+    if type(v) in (float, complex):
+        return hash((v, _signs(v)))
+    if not is_possible_expression(v):
+        try:
+            return hash(v)
+        except TypeError:
+            return hash(type(v))
+
+    operand_hashes = []
+
+    def hash_operand(operand):
+        operand_hashes.append(_hash_(operand))
+        return operand
+
+    _map_(v, hash_operand)
+    if isinstance(v, (Mapping, SimpleNamespace)):
+        # mappings are equal regardless of order
+        return hash((type(v), frozenset(operand_hashes)))
+    return hash((type(v), *operand_hashes))
+
+
+# attributes that pickle and copy look up on instances, these must never be delayed
+_protocol_attributes = frozenset(('__getstate__', '__setstate__', '__reduce__', '__reduce_ex__', '__getnewargs__',
+                                  '__getnewargs_ex__', '__copy__', '__deepcopy__'))
 
 
 class SingleParamExpression(ABC):
+    _structural_hash = None
+    _calls_pure = None
+
     @abstractmethod
     def _evaluate(self, v):
         pass
 
     def __getattr__(self, item):
-        if item.startswith('__') and not item.endswith('_'):
+        if (item.startswith('__') and not item.endswith('_')) or item in _protocol_attributes:
             raise AttributeError(item)
         return GetAttr(self, item)
 
@@ -56,63 +144,8 @@ class SingleParamExpression(ABC):
     def __call__(self, *args, **kwargs):
         return Call(self, *args, **kwargs)
 
-    for b_op, op_str in ((add, '+'),
-                         (sub, '-'),
-                         (mul, '*'),
-                         (truediv, '/'),
-                         (floordiv, '//'),
-                         (mod, '%'),
-                         (pow, '**'),
-                         (matmul, '@'),
-                         (lshift, '<<'),
-                         (rshift, '>>'),
-                         (or_, '|'),
-                         (and_, '&'),
-                         (xor, '^'),):
-        op = b_op.__name__
-        op_name = op.strip('_')
-        exec(dedent(f"""
-            def __{op_name}__(self, other):
-                return BinOp({op_str!r},{op}, self, other)
-            def __r{op_name}__(self, other):
-                return BinOp({op_str!r},{op}, other, self)
-        """))
-
-    for b_op, op_str in ((ge, '>='),
-                         (gt, '>'),
-                         (le, '<='),
-                         (lt, '<'),
-                         (eq, '=='),
-                         (ne, '!='),):
-        op = b_op.__name__
-        op_name = op.strip('_')
-        exec(dedent(f"""
-            def __{op_name}__(self, other):
-                return BinOp({op_str!r},{op}, self, other)
-        """))
-
-    for u_op, op_str in ((invert, '~'),
-                         (neg, '-'),
-                         (pos, '+'),):
-        op = u_op.__name__
-        op_name = op.strip('_')
-        exec(dedent(f"""
-            def __{op_name}__(self):
-                return UnOp({op_str!r},{op}, self)
-        """))
-
-    for u_func in (abs,
-                   ceil,
-                   floor,
-                   trunc,
-                   round,
-                   reversed):
-        op = u_func.__name__
-        op_name = op.strip('_')
-        exec(dedent(f"""
-            def __{op_name}__(self):
-                return Call({op}, self)
-        """))
+    # the operator methods are added below, __eq__ returns an expression so expressions are unhashable
+    __hash__ = None
 
     def __divmod__(self, other):
         return Call(divmod, self, other)
@@ -120,10 +153,85 @@ class SingleParamExpression(ABC):
     def __getitem__(self, item):
         return GetItem(self, item)
 
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        # numpy functions applied to expressions (such as np.sqrt(_)) are delayed like any other function
+        if method == '__call__':
+            return Call(ufunc, *inputs, **kwargs)
+        return Call(getattr(ufunc, method), *inputs, **kwargs)
+
     @abstractmethod
     def _eq(self, other) -> bool:
         pass
 
+    def _hash(self) -> int:
+        # the hash is computed only once, since expressions are immutable
+        if self._structural_hash is None:
+            self._structural_hash = self._calc_hash()
+        return self._structural_hash
+
+    @abstractmethod
+    def _calc_hash(self) -> int:
+        # a hash consistent with _eq
+        pass
+
+    def _compile(self, compiler: _Compiler) -> str:
+        # nodes that don't know how to compile themselves are called as-is from the compiled code
+        return compiler.const(self._evaluate) + '(' + compiler.param + ')'
+
+    def _postfix(self) -> list:
+        # the operands of the node (to be evaluated in order) and the instructions that follow them, see _flatten
+        return [_Instruction(_PARAM), _Instruction(_APPLY, self._evaluate, 1)]
+
+    @abstractmethod
+    def _map(self, func: Callable[[Any], Any]) -> SingleParamExpression:
+        # return a similar expression, with func applied to all the operands
+        pass
+
+    def _pure(self) -> bool:
+        # whether the node can be evaluated ahead of time, provided all its operands are constant
+        return True
+
+    def _lowered(self) -> Optional[Callable[[Any], Any]]:
+        # an equivalent C-implemented operator callable, if the expression has a simple enough shape
+        return None
+
+
+def _operator_method(name: str, method):
+    method.__name__ = name
+    method.__qualname__ = SingleParamExpression.__name__ + '.' + name
+    setattr(SingleParamExpression, name, method)
+
+
+def _add_operator_methods():
+    def binary(op_str, op):
+        return lambda self, other: BinOp(op_str, op, self, other)
+
+    def reflected(op_str, op):
+        return lambda self, other: BinOp(op_str, op, other, self)
+
+    def unary(op_str, op):
+        return lambda self: UnOp(op_str, op, self)
+
+    def call(func):
+        return lambda self: Call(func, self)
+
+    for op, op_str in _binary_operators:
+        op_name = op.__name__.strip('_')
+        _operator_method(f'__{op_name}__', binary(op_str, op))
+        _operator_method(f'__r{op_name}__', reflected(op_str, op))
+
+    for op, op_str in _comparison_operators:
+        _operator_method(f'__{op.__name__}__', binary(op_str, op))
+
+    for op, op_str in _unary_operators:
+        _operator_method(f'__{op.__name__}__', unary(op_str, op))
+
+    for func in (abs, ceil, floor, trunc, round, reversed):
+        _operator_method(f'__{func.__name__}__', call(func))
+
+
+_add_operator_methods()
+
 
 class Const(SingleParamExpression):
     def __init__(self, c, name=None):
@@ -138,9 +246,47 @@ class Const(SingleParamExpression):
             return self.__name
         return f'Const({self.__c!r})'
 
+    def __reduce__(self):
+        if self.__name and _named_constants.get(self.__name) is self:
+            return _named_constant, (self.__name,)
+        return type(self), (self.__c, self.__name)
+
     def _eq(self, other) -> bool:
         return type(self) is type(other) \
-               and self.__c == other.__c
+               and _eq_(self.__c, other.__c)
+
+    def _calc_hash(self) -> int:
+        return hash((type(self), _hash_(self.__c)))
+
+    def _compile(self, compiler: _Compiler) -> str:
+        return compiler.const(self.__c)
+
+    def _postfix(self) -> list:
+        return [_Instruction(_PUSH, self.__c)]
+
+    def _map(self, func):
+        return self
+
+
+_named_constants = {}
+
+
+def named_constant(const: Const) -> Const:
+    """
+    Register a named Const, so that it is serialized by its name (its value need not be serializable).
+    """
+    name = repr(const)
+    if name.startswith('Const('):
+        raise ValueError('only named constants can be registered')
+    _named_constants[name] = const
+    return const
+
+
+def _named_constant(name: str) -> Const:
+    if name not in _named_constants:
+        # the delayed builtins are registered when they are first imported
+        import expressive.delayed  # noqa: F401
+    return _named_constants[name]
 
 
 class BinOp(SingleParamExpression):
@@ -158,12 +304,32 @@ class BinOp(SingleParamExpression):
     def __repr__(self):
         return repr(self.__lhs) + ' ' + self.__op_str + ' ' + repr(self.__rhs)
 
+    def __reduce__(self):
+        return type(self), (self.__op_str, self.__op, self.__lhs, self.__rhs)
+
     def _eq(self, other) -> bool:
         return type(self) is type(other) \
                and self.__op == other.__op \
                and _eq_(self.__lhs, other.__lhs) \
                and _eq_(self.__rhs, other.__rhs)
 
+    def _calc_hash(self) -> int:
+        return hash((type(self), self.__op, _hash_(self.__lhs), _hash_(self.__rhs)))
+
+    def _compile(self, compiler: _Compiler) -> str:
+        lhs = compiler.operand(self.__lhs)
+        rhs = compiler.operand(self.__rhs)
+        if _operator_symbols.get(self.__op) == self.__op_str:
+            return '(' + lhs + ' ' + self.__op_str + ' ' + rhs + ')'
+        return compiler.const(self.__op) + '(' + lhs + ', ' + rhs + ')'
+
+    def _postfix(self) -> list:
+        return [self.__lhs, self.__rhs, _Instruction(_APPLY, self.__op, 2)]
+
+    def _map(self, func):
+        args = _map_by_element((self.__lhs, self.__rhs), func)
+        return type(self)(self.__op_str, self.__op, *args) if args else self
+
 
 class UnOp(SingleParamExpression):
     def __init__(self, op_str: str, op: Callable[[Any], Any], inner):
@@ -178,11 +344,30 @@ class UnOp(SingleParamExpression):
     def __repr__(self):
         return self.__op_str + repr(self.__inner)
 
+    def __reduce__(self):
+        return type(self), (self.__op_str, self.__op, self.__inner)
+
     def _eq(self, other) -> bool:
         return type(self) is type(other) \
                and self.__op == other.__op \
                and _eq_(self.__inner, other.__inner)
 
+    def _calc_hash(self) -> int:
+        return hash((type(self), self.__op, _hash_(self.__inner)))
+
+    def _compile(self, compiler: _Compiler) -> str:
+        inner = compiler.operand(self.__inner)
+        if _operator_symbols.get(self.__op) == self.__op_str:
+            return '(' + self.__op_str + inner + ')'
+        return compiler.const(self.__op) + '(' + inner + ')'
+
+    def _postfix(self) -> list:
+        return [self.__inner, _Instruction(_APPLY, self.__op, 1)]
+
+    def _map(self, func):
+        inner = func(self.__inner)
+        return type(self)(self.__op_str, self.__op, inner) if inner is not self.__inner else self
+
 
 class Call(SingleParamExpression):
     def __init__(self, op: Union[Callable, SingleParamExpression], *args: Any, **kwargs: Any):
@@ -207,6 +392,9 @@ class Call(SingleParamExpression):
             op = self.__op.__name__
         return op + '(' + ', '.join(args) + ')'
 
+    def __reduce__(self):
+        return _make_call, (type(self), self.__op, self.__args, self.__kwargs)
+
     def _eq(self, other) -> bool:
         return type(self) is type(other) \
                and _eq_(self.__op, other.__op) \
@@ -216,6 +404,60 @@ class Call(SingleParamExpression):
                and self.__kwargs.keys() == other.__kwargs.keys() \
                and all(_eq_(v, other.__kwargs[k]) for (k, v) in self.__kwargs.items())
 
+    def _calc_hash(self) -> int:
+        return hash((type(self), _hash_(self.__op), *(_hash_(a) for a in self.__args),
+                     frozenset((k, _hash_(v)) for (k, v) in self.__kwargs.items())))
+
+    def _compile(self, compiler: _Compiler) -> str:
+        args = [compiler.operand(a) for a in self.__args]
+        if all(_is_identifier(k) for k in self.__kwargs):
+            args.extend(k + '=' + compiler.operand(v) for (k, v) in self.__kwargs.items())
+        elif self.__kwargs:
+            args.append('**{' + ', '.join(compiler.const(k) + ': ' + compiler.operand(v)
+                                          for (k, v) in self.__kwargs.items()) + '}')
+        return compiler.operand(self.__op) + '(' + ', '.join(args) + ')'
+
+    def _postfix(self) -> list:
+        n_args = len(self.__args)
+        keys = tuple(self.__kwargs)
+        if keys:
+            def call(op, *args):
+                return op(*args[:n_args], **dict(zip(keys, args[n_args:])))
+        else:
+            call = _call
+        return [self.__op, *self.__args, *self.__kwargs.values(), _Instruction(_APPLY, call, n_args + len(keys) + 1)]
+
+    def _map(self, func):
+        args = _map_by_element((self.__op, *self.__args, *self.__kwargs.values()), func)
+        if not args:
+            return self
+        kwargs_start = len(self.__args) + 1
+        return type(self)(*args[:kwargs_start], **dict(zip(self.__kwargs, args[kwargs_start:])))
+
+    def _pure(self) -> bool:
+        if is_expression(self.__op) and not isinstance(self.__op, Const):
+            # we can't know in advance what will be called, so we must assume the worst
+            return False
+        return not is_impure(evaluate(self.__op, None))
+
+    def _lowered(self):
+        # a method call with constant arguments is a methodcaller
+        if not (isinstance(self.__op, GetAttr)
+                and all(map(_is_constant, self.__args))
+                and all(map(_is_constant, self.__kwargs.values()))):
+            return None
+        getter = self.__op._lowered()
+        if type(getter) is not attrgetter:
+            return None
+        name, = getter.__reduce__()[1]
+        if '.' in name:
+            return None
+        return methodcaller(name, *self.__args, **self.__kwargs)
+
+
+def _make_call(cls, op, args: tuple, kwargs: dict) -> Call:
+    return cls(op, *args, **kwargs)
+
 
 class GetItem(SingleParamExpression):
     def __init__(self, container, item):
@@ -230,11 +472,32 @@ class GetItem(SingleParamExpression):
     def __repr__(self):
         return repr(self.__container) + '[' + repr(self.__item) + ']'
 
+    def __reduce__(self):
+        return type(self), (self.__container, self.__item)
+
     def _eq(self, other) -> bool:
         return type(self) is type(other) \
                and _eq_(self.__container, other.__container) \
                and _eq_(self.__item, other.__item)
 
+    def _calc_hash(self) -> int:
+        return hash((type(self), _hash_(self.__container), _hash_(self.__item)))
+
+    def _compile(self, compiler: _Compiler) -> str:
+        return compiler.operand(self.__container) + '[' + compiler.operand(self.__item) + ']'
+
+    def _postfix(self) -> list:
+        return [self.__container, self.__item, _Instruction(_APPLY, getitem, 2)]
+
+    def _lowered(self):
+        if isinstance(self.__container, _Parameter) and _is_constant(self.__item):
+            return itemgetter(self.__item)
+        return None
+
+    def _map(self, func):
+        args = _map_by_element((self.__container, self.__item), func)
+        return type(self)(*args) if args else self
+
 
 class GetAttr(SingleParamExpression):
     def __init__(self, parent, attr: str):
@@ -248,11 +511,49 @@ class GetAttr(SingleParamExpression):
     def __repr__(self):
         return repr(self.__parent) + '.' + self.__attr
 
+    def __reduce__(self):
+        return type(self), (self.__parent, self.__attr)
+
     def _eq(self, other) -> bool:
         return type(self) is type(other) \
                and _eq_(self.__parent, other.__parent) \
                and _eq_(self.__attr, other.__attr)
 
+    def _calc_hash(self) -> int:
+        return hash((type(self), _hash_(self.__parent), self.__attr))
+
+    def _compile(self, compiler: _Compiler) -> str:
+        parent = compiler.operand(self.__parent)
+        if _is_identifier(self.__attr):
+            return parent + '.' + self.__attr
+        return 'getattr(' + parent + ', ' + compiler.const(self.__attr) + ')'
+
+    def _postfix(self) -> list:
+        attr = self.__attr
+        if _is_identifier(attr):
+            get = attrgetter(attr)
+        else:
+            def get(parent):
+                return getattr(parent, attr)
+        return [self.__parent, _Instruction(_APPLY, get, 1)]
+
+    def _lowered(self):
+        if not _is_identifier(self.__attr):
+            return None
+        if isinstance(self.__parent, _Parameter):
+            return attrgetter(self.__attr)
+        if isinstance(self.__parent, GetAttr):
+            # a chain of attributes is a dotted attrgetter
+            parent = self.__parent._lowered()
+            if parent is not None:
+                path, = parent.__reduce__()[1]
+                return attrgetter(path + '.' + self.__attr)
+        return None
+
+    def _map(self, func):
+        parent = func(self.__parent)
+        return type(self)(parent, self.__attr) if parent is not self.__parent else self
+
 
 class _Parameter(SingleParamExpression):
     def _evaluate(self, v):
@@ -261,9 +562,44 @@ class _Parameter(SingleParamExpression):
     def __repr__(self):
         return '_'
 
+    def __reduce__(self):
+        # the parameter is a singleton, pickled by reference
+        return '_'
+
     def _eq(self, other) -> bool:
         return type(self) == type(other)
 
+    def _calc_hash(self) -> int:
+        return hash(type(self))
+
+    def _compile(self, compiler: _Compiler) -> str:
+        return compiler.param
+
+    def _postfix(self) -> list:
+        return [_Instruction(_PARAM)]
+
+    def _map(self, func):
+        return self
+
+
+@lru_cache(maxsize=None)
+def _dataclass_field_names(cls: type) -> Optional[tuple]:
+    if not hasattr(cls, '__dataclass_fields__'):
+        return None
+    # dataclasses was already imported to define the class
+    from dataclasses import fields
+    return tuple(f.name for f in fields(cls))
+
+
+def _field_names(v) -> Optional[tuple]:
+    # the fields of a dataclass or namedtuple-like object, or None if it has none
+    if isinstance(v, type):
+        return None
+    ret = _dataclass_field_names(type(v))
+    if ret is None and hasattr(v, '_fields'):
+        ret = v._fields
+    return ret
+
 
 def _evaluate_by_element(self: Iterable, v) -> Optional[list]:
     ret = []
@@ -277,12 +613,7 @@ def _evaluate_by_element(self: Iterable, v) -> Optional[list]:
 
 @singledispatch
 def evaluate(self, v):
-    field_names = None
-
-    if is_dataclass(self) and not isinstance(self, type):
-        field_names = [f.name for f in fields(self)]
-    elif hasattr(self, '_fields'):
-        field_names = self._fields
+    field_names = _field_names(self)
 
     if field_names:
         values = [getattr(self, field) for field in field_names]
@@ -292,17 +623,17 @@ def evaluate(self, v):
     return self
 
 
-@evaluate.register
+@evaluate.register(SingleParamExpression)
 def _(self: SingleParamExpression, v):
     return self._evaluate(v)
 
 
-@evaluate.register
+@evaluate.register(list)
 def _(self: list, v):
     return _evaluate_by_element(self, v) or self
 
 
-@evaluate.register
+@evaluate.register(tuple)
 def _(self: tuple, v):
     args = _evaluate_by_element(self, v)
     if not args:
@@ -312,7 +643,7 @@ def _(self: tuple, v):
     return tuple(args)
 
 
-@evaluate.register
+@evaluate.register(slice)
 def _(self: slice, v):
     return slice(
         evaluate(self.start, v),
@@ -321,57 +652,1009 @@ def _(self: slice, v):
     )
 
 
-@evaluate.register
+@evaluate.register(dict)
 def _(self: dict, v):
     tuples = _evaluate_by_element(self.items(), v)
     return dict(tuples) if tuples else self
 
 
-@evaluate.register
+@evaluate.register(BaseException)
 def _(self: BaseException, v):
     args = _evaluate_by_element(self.args, v)
     return type(self)(*args) if args else self
 
 
-@evaluate.register
+@evaluate.register(SimpleNamespace)
 def _(self: SimpleNamespace, v):
     args = _evaluate_by_element(self.__dict__.items(), v)
     return SimpleNamespace(**dict(args)) if args else self
 
 
-@evaluate.register
+@evaluate.register(ChainMap)
 def _(self: ChainMap, v):
     args = _evaluate_by_element(self.maps, v)
     return ChainMap(*args) if args else self
 
 
-@evaluate.register
+@evaluate.register(Counter)
 def _(self: Counter, v):
     args = _evaluate_by_element(self.items(), v)
     return Counter(dict(args)) if args else self
 
 
+def _map_by_element(self: Iterable, func: Callable[[Any], Any]) -> Optional[list]:
+    ret = []
+    diffs = False
+    for a in self:
+        b = func(a)
+        diffs |= a is not b
+        ret.append(b)
+    return ret if diffs else None
+
+
+@singledispatch
+def _map_(self, func: Callable[[Any], Any]):
+    # apply func to all the operands of a value, returning the value itself if no operand changed
+    field_names = _field_names(self)
+
+    if field_names:
+        values = [getattr(self, field) for field in field_names]
+        args = _map_by_element(values, func)
+        return type(self)(**dict(zip(field_names, args))) if args else self
+
+    return self
+
+
+@_map_.register(SingleParamExpression)
+def _(self: SingleParamExpression, func):
+    return self._map(func)
+
+
+@_map_.register(list)
+def _(self: list, func):
+    return _map_by_element(self, func) or self
+
+
+@_map_.register(tuple)
+def _(self: tuple, func):
+    args = _map_by_element(self, func)
+    if not args:
+        return self
+    if hasattr(self, '_make'):
+        return self._make(args)
+    return tuple(args)
+
+
+@_map_.register(slice)
+def _(self: slice, func):
+    args = _map_by_element((self.start, self.stop, self.step), func)
+    return slice(*args) if args else self
+
+
+@_map_.register(dict)
+def _(self: dict, func):
+    tuples = _map_by_element(self.items(), func)
+    return dict(tuples) if tuples else self
+
+
+@_map_.register(BaseException)
+def _(self: BaseException, func):
+    args = _map_by_element(self.args, func)
+    return type(self)(*args) if args else self
+
+
+@_map_.register(SimpleNamespace)
+def _(self: SimpleNamespace, func):
+    args = _map_by_element(self.__dict__.items(), func)
+    return SimpleNamespace(**dict(args)) if args else self
+
+
+@_map_.register(ChainMap)
+def _(self: ChainMap, func):
+    args = _map_by_element(self.maps, func)
+    return ChainMap(*args) if args else self
+
+
+@_map_.register(Counter)
+def _(self: Counter, func):
+    args = _map_by_element(self.items(), func)
+    return Counter(dict(args)) if args else self
+
+
+# these either have side effects, or return a new iterator or mutable object on every call, so they must not be folded
+_impure_callables = {bytearray, dict, dir, enumerate, eval, filter, iter, list, map, next, open, print, reversed, set,
+                     setattr, sorted, zip}
+
+
+def impure(func):
+    """
+    Mark a callable as having side effects (or as returning a new mutable object on every call), so that calls to it
+    are never evaluated ahead of time by optimize.
+    """
+    _impure_callables.add(func)
+    return func
+
+
+def is_impure(func) -> bool:
+    try:
+        return func in _impure_callables
+    except TypeError:
+        # unhashable callables cannot be registered
+        return False
+
+
+# callables whose calls can be evaluated once in place of several identical calls, the operator and math functions
+# are pure as well
+_pure_callables = {abs, ascii, bin, bool, callable, chr, complex, divmod, float, format, getattr, hasattr, hash, hex,
+                   int, isinstance, issubclass, len, oct, ord, pow, repr, round, slice, str, type}
+_pure_modules = frozenset(('operator', '_operator', 'math'))
+
+
+def pure(func):
+    """
+    Mark a callable as having no side effects, so that compiled expressions may evaluate identical calls to it once.
+    """
+    _pure_callables.add(func)
+    return func
+
+
+def is_pure(func) -> bool:
+    try:
+        if func in _pure_callables:
+            return True
+    except TypeError:
+        # unhashable callables cannot be registered
+        return False
+    return getattr(func, '__module__', None) in _pure_modules and not is_impure(func)
+
+
+_mutable_types = (list, dict, set, bytearray)
+
+
+def _fold(value):
+    # returns the folded value, and whether it is constant (and so can be folded into its parent)
+    if isinstance(value, _Parameter):
+        return value, False
+    constant = True
+
+    def fold_operand(operand):
+        nonlocal constant
+        operand, operand_constant = _fold(operand)
+        constant = constant and operand_constant
+        return operand
+
+    value = _map_(value, fold_operand)
+    if not (constant and is_expression(value)) or isinstance(value, Const):
+        return value, constant
+    if not value._pure():
+        return value, False
+    try:
+        result = evaluate(value, None)
+    except Exception:
+        # leave the error to be raised when the expression is evaluated
+        return value, False
+    if isinstance(result, _mutable_types):
+        # every evaluation must return a new mutable object, so the node is kept, though its parent may be folded
+        return value, True
+    return Const(result), True
+
+
+def optimize(spe):
+    """
+    Evaluate all the parts of an expression that do not depend on the parameter ahead of time, replacing them with
+    constants. Calls to impure callables, and parts that evaluate to mutable containers (lists, dicts, sets and
+    bytearrays), are left to be evaluated on every call.
+    """
+    return _fold(spe)[0]
+
+
+class StructuralKey:
+    """
+    A hashable wrapper around an expression (or any other value), equal to keys of structurally equal expressions.
+    """
+    __slots__ = ('value', '_hash')
+
+    def __init__(self, value):
+        self.value = value
+        self._hash = _hash_(value)
+
+    def __hash__(self):
+        return self._hash
+
+    def __eq__(self, other):
+        return isinstance(other, StructuralKey) \
+               and self._hash == other._hash \
+               and _eq_(self.value, other.value)
+
+    def __repr__(self):
+        return f'StructuralKey({self.value!r})'
+
+
+class InternTable:
+    """
+    A table of canonical expressions, interning an expression returns the canonical instance of all structurally
+    equal expressions, so that interned expressions (and their interned subexpressions) can be compared by identity.
+    """
+
+    def __init__(self):
+        self._table = {}
+
+    def intern(self, spe):
+        spe = _map_(spe, self.intern)
+        if not is_expression(spe):
+            return spe
+        return self._table.setdefault(StructuralKey(spe), spe)
+
+    def __len__(self):
+        return len(self._table)
+
+    def __contains__(self, item):
+        return StructuralKey(item) in self._table
+
+    def clear(self):
+        self._table.clear()
+
+
+def _is_identifier(name) -> bool:
+    return isinstance(name, str) and name.isidentifier() and not iskeyword(name)
+
+
+def _coalesce(first, *thunks):
+    for thunk in thunks:
+        if first is not None:
+            return first
+        first = thunk()
+    return first
+
+
+def _only_pure_calls(value) -> bool:
+    # whether every call in a value is to a callable known to be pure, so that evaluating it once is the same as
+    # evaluating it several times
+    if is_expression(value) and value._calls_pure is not None:
+        return value._calls_pure
+    ret = True
+    if isinstance(value, Call):
+        op = value.__reduce__()[1][1]
+        if isinstance(op, Const):
+            op = op._evaluate(None)
+        ret = not is_expression(op) and is_pure(op)
+
+    def check(operand):
+        nonlocal ret
+        ret = ret and _only_pure_calls(operand)
+        return operand
+
+    if is_expression(value):
+        value._map(check)
+        value._calls_pure = ret
+    else:
+        _map_(value, check)
+    return ret
+
+
+def _is_shareable(value) -> bool:
+    return is_expression(value) and not isinstance(value, (Const, _Parameter)) and value._pure() \
+           and _only_pure_calls(value)
+
+
+class _Compiler:
+    """
+    Lowers an expression to the source of a python function, constants and callables are referenced by name from
+    the function's global namespace. Subexpressions in shared are evaluated once, into local variables.
+    """
+    param = 'v'
+
+    def __init__(self, shared: Iterable = ()):
+        self.namespace = {}
+        self.statements = []
+        self._const_names = {}
+        self._shared_names = {StructuralKey(s): None for s in shared}
+
+    def const(self, value) -> str:
+        name = self._const_names.get(id(value))
+        if name is None:
+            name = self._const_names[id(value)] = f'_c{len(self._const_names)}'
+            self.namespace[name] = value
+        return name
+
+    def source(self, value) -> Optional[str]:
+        # returns None if the value is not an expression, and should be used as-is
+        if not (self._shared_names and _is_shareable(value)):
+            return _compile_(value, self)
+        key = StructuralKey(value)
+        if key not in self._shared_names:
+            return _compile_(value, self)
+        name = self._shared_names[key]
+        if name is None:
+            source = _compile_(value, self)
+            name = self._shared_names[key] = f'_t{len(self.statements)}'
+            self.statements.append(name + ' = ' + source)
+        return name
+
+    def operand(self, value) -> str:
+        source = self.source(value)
+        if source is None:
+            return self.const(value)
+        return source
+
+    def lazy_operand(self, value) -> str:
+        # an operand that is only evaluated under some condition
+        return self.operand(value)
+
+    def conditional(self, then, condition, otherwise) -> str:
+        return '(' + self.lazy_operand(then) + ' if ' + self.operand(condition) \
+               + ' else ' + self.lazy_operand(otherwise) + ')'
+
+    def short_circuit(self, keyword: str, operands) -> str:
+        # keyword is either 'and' or 'or'
+        first, *rest = operands
+        return '(' + ' '.join([self.operand(first), *(keyword + ' ' + self.lazy_operand(o) for o in rest)]) + ')'
+
+    def coalesce(self, operands) -> str:
+        first, *rest = operands
+        lazy_rest = ('lambda: ' + self.lazy_operand(o) for o in rest)
+        return self.const(_coalesce) + '(' + ', '.join([self.operand(first), *lazy_rest]) + ')'
+
+    def function(self, spe):
+        ret = self.operand(spe)
+        lines = [f'def __call__(self, {self.param}):']
+        lines.extend('    ' + s for s in self.statements)
+        lines.append('    return ' + ret)
+        source = '\n'.join(lines) + '\n'
+        exec(compile(source, '<expressive>', 'exec'), self.namespace)
+        return self.namespace['__call__'], source
+
+
+class _SubexpressionCounter(_Compiler):
+    # a dry run of the compiler, finding all the subexpressions that are evaluated unconditionally more than once
+    def __init__(self):
+        super().__init__()
+        self._lazy = 0
+        self._seen = {}  # maps subexpression keys to [count, evaluated unconditionally]
+
+    def source(self, value) -> Optional[str]:
+        if not _is_shareable(value):
+            return super().source(value)
+        key = StructuralKey(value)
+        entry = self._seen.get(key)
+        if entry is None:
+            self._seen[key] = [1, not self._lazy]
+        else:
+            entry[0] += 1
+            if entry[1] or self._lazy:
+                return ''
+            entry[1] = True
+        # the operands of the subexpression also need to be counted (again, if it is now known to be unconditional)
+        return super().source(value)
+
+    def lazy_operand(self, value) -> str:
+        self._lazy += 1
+        try:
+            return super().lazy_operand(value)
+        finally:
+            self._lazy -= 1
+
+    def shared(self, spe) -> list:
+        self.operand(spe)
+        return [key.value for (key, (count, unconditional)) in self._seen.items() if count > 1 and unconditional]
+
+
+def _compile_by_element(self: Iterable, compiler: _Compiler) -> Optional[list]:
+    ret = []
+    diffs = False
+    for a in self:
+        b = compiler.source(a)
+        if b is None:
+            b = compiler.const(a)
+        else:
+            diffs = True
+        ret.append(b)
+    return ret if diffs else None
+
+
+@singledispatch
+def _compile_(self, compiler: _Compiler) -> Optional[str]:
+    # returns None if the value is not an expression, and should be used as-is
+    field_names = _field_names(self)
+
+    if field_names:
+        args = _compile_by_element((getattr(self, field) for field in field_names), compiler)
+        if not args:
+            return None
+        return compiler.const(type(self)) + '(**{' + ', '.join(
+            compiler.const(k) + ': ' + a for (k, a) in zip(field_names, args)) + '})'
+
+    return None
+
+
+@_compile_.register(SingleParamExpression)
+def _(self: SingleParamExpression, compiler: _Compiler):
+    return self._compile(compiler)
+
+
+@_compile_.register(list)
+def _(self: list, compiler: _Compiler):
+    args = _compile_by_element(self, compiler)
+    return args and '[' + ', '.join(args) + ']'
+
+
+@_compile_.register(tuple)
+def _(self: tuple, compiler: _Compiler):
+    args = _compile_by_element(self, compiler)
+    if not args:
+        return None
+    if hasattr(self, '_make'):
+        return compiler.const(self._make) + '((' + ''.join(a + ', ' for a in args) + '))'
+    return '(' + ''.join(a + ', ' for a in args) + ')'
+
+
+@_compile_.register(slice)
+def _(self: slice, compiler: _Compiler):
+    args = _compile_by_element((self.start, self.stop, self.step), compiler)
+    return args and 'slice(' + ', '.join(args) + ')'
+
+
+def _compile_items(items, compiler: _Compiler) -> Optional[str]:
+    args = _compile_by_element(chain.from_iterable(items), compiler)
+    return args and '{' + ', '.join(k + ': ' + v for (k, v) in zip(args[::2], args[1::2])) + '}'
+
+
+@_compile_.register(dict)
+def _(self: dict, compiler: _Compiler):
+    return _compile_items(self.items(), compiler)
+
+
+@_compile_.register(BaseException)
+def _(self: BaseException, compiler: _Compiler):
+    args = _compile_by_element(self.args, compiler)
+    return args and compiler.const(type(self)) + '(' + ', '.join(args) + ')'
+
+
+@_compile_.register(SimpleNamespace)
+def _(self: SimpleNamespace, compiler: _Compiler):
+    args = _compile_items(self.__dict__.items(), compiler)
+    return args and compiler.const(SimpleNamespace) + '(**' + args + ')'
+
+
+@_compile_.register(ChainMap)
+def _(self: ChainMap, compiler: _Compiler):
+    args = _compile_by_element(self.maps, compiler)
+    return args and compiler.const(ChainMap) + '(' + ', '.join(args) + ')'
+
+
+@_compile_.register(Counter)
+def _(self: Counter, compiler: _Compiler):
+    args = _compile_items(self.items(), compiler)
+    return args and compiler.const(Counter) + '(' + args + ')'
+
+
+class _Template(SingleParamExpression):
+    # a container literal that contains expressions, with the positions of the expressions found in advance
+    def __init__(self, literal, build: Callable[[list], Any], elements: list, dependent: tuple):
+        self.__literal = literal
+        self.__build = build
+        self.__elements = elements
+        self.__dependent = dependent
+
+    def _evaluate(self, v):
+        elements = self.__elements.copy()
+        for i, element in self.__dependent:
+            elements[i] = element._evaluate(v)
+        return self.__build(elements)
+
+    def __repr__(self):
+        return repr(self.__literal)
+
+    def __reduce__(self):
+        return _finalize, (self.__literal,)
+
+    def _eq(self, other) -> bool:
+        return type(self) is type(other) \
+               and _eq_(self.__literal, other.__literal)
+
+    def _calc_hash(self) -> int:
+        return _hash_(self.__literal)
+
+    def _compile(self, compiler: _Compiler) -> str:
+        return compiler.operand(self.__literal)
+
+    def _postfix(self) -> list:
+        return [self.__literal]
+
+    def _map(self, func):
+        literal = _map_(self.__literal, func)
+        return _finalize_operand(literal) if literal is not self.__literal else self
+
+
+@singledispatch
+def _literal_parts(self) -> Optional[tuple]:
+    # the elements of a container literal and a function to build a similar container from them, or None if the
+    # value is not a container literal
+    field_names = _field_names(self)
+
+    if field_names:
+        cls = type(self)
+        return [getattr(self, field) for field in field_names], lambda a: cls(**dict(zip(field_names, a)))
+
+    return None
+
+
+@_literal_parts.register(SingleParamExpression)
+def _(self: SingleParamExpression):
+    return None
+
+
+@_literal_parts.register(list)
+def _(self: list):
+    return list(self), list
+
+
+@_literal_parts.register(tuple)
+def _(self: tuple):
+    if hasattr(self, '_make'):
+        return list(self), self._make
+    return list(self), tuple
+
+
+@_literal_parts.register(slice)
+def _(self: slice):
+    return [self.start, self.stop, self.step], lambda a: slice(*a)
+
+
+@_literal_parts.register(dict)
+def _(self: dict):
+    return list(self.items()), dict
+
+
+@_literal_parts.register(BaseException)
+def _(self: BaseException):
+    cls = type(self)
+    return list(self.args), lambda a: cls(*a)
+
+
+@_literal_parts.register(SimpleNamespace)
+def _(self: SimpleNamespace):
+    return list(self.__dict__.items()), lambda a: SimpleNamespace(**dict(a))
+
+
+@_literal_parts.register(ChainMap)
+def _(self: ChainMap):
+    return list(self.maps), lambda a: ChainMap(*a)
+
+
+@_literal_parts.register(Counter)
+def _(self: Counter):
+    return list(self.items()), lambda a: Counter(dict(a))
+
+
+def _finalize(value):
+    # prepare a value for repeated evaluation, finding the expressions in all container literals in advance
+    if is_expression(value):
+        return value._map(_finalize_operand)
+    parts = _literal_parts(value)
+    if parts is None:
+        return value
+    elements, build = parts
+    elements = [_finalize(element) for element in elements]
+    dependent = tuple((i, element) for (i, element) in enumerate(elements) if is_expression(element))
+    if not dependent:
+        return value
+    return _Template(value, build, elements, dependent)
+
+
+def _finalize_operand(value) -> SingleParamExpression:
+    value = _finalize(value)
+    if is_expression(value):
+        return value
+    # constant operands are evaluated faster as Consts
+    return Const(value)
+
+
 class _Evaluated:
+    _vectorized = None
+
     def __init__(self, spe):
         self.spe = spe
+        self._finalized = _finalize_operand(spe)
 
     def __call__(self, v):
-        return evaluate(self.spe, v)
+        return evaluate(self._finalized, v)
 
     def __repr__(self):
         return f'e({self.spe!r})'
 
+    def __reduce__(self):
+        return _interpret, (self.spe,)
+
+    def vectorized(self, v):
+        """
+        Evaluate the expression over entire numpy arrays (or a mapping of column names to arrays) at once.
+        """
+        if self._vectorized is None:
+            from expressive.vectorized import vectorize
+            self._vectorized = vectorize(self.spe)
+        return self._vectorized(v)
+
+
+def _unfinalized(spe):
+    # the expression of a finalized expression, so that it can be compiled along with others
+    if isinstance(spe, _Evaluated):
+        return spe.spe
+    return spe
+
+
+def _is_constant(value) -> bool:
+    # whether a value contains no expressions
+    return not is_expression(_finalize(value))
+
+
+def _lower(spe) -> Optional[Callable[[Any], Any]]:
+    if is_expression(spe):
+        return spe._lowered()
+    if type(spe) is tuple and len(spe) > 1:
+        # a tuple of attributes or items is a single getter with multiple arguments
+        getters = [element._lowered() if is_expression(element) else None for element in spe]
+        for getter_type in (attrgetter, itemgetter):
+            if all(type(getter) is getter_type for getter in getters):
+                return getter_type(*chain.from_iterable(getter.__reduce__()[1] for getter in getters))
+    return None
 
-def e(spe):
+
+class _Lowered(_Evaluated):
+    # each lowered expression gets its own subclass, whose __call__ is an operator callable
+    def __init__(self, spe):
+        self.spe = spe
+
+
+def _lowered_e(spe) -> Optional[_Evaluated]:
+    getter = _lower(spe)
+    if getter is None:
+        return None
+    return type(_Lowered.__name__, (_Lowered,), {'__call__': getter})(spe)
+
+
+class _Compiled(_Evaluated):
+    # each compiled expression gets its own subclass, whose __call__ is the generated function
+    def __init__(self, spe, source: str, share: bool):
+        self.spe = spe
+        self.source = source
+        self.share = share
+
+    def __reduce__(self):
+        # the generated class cannot be pickled, so the expression is compiled again
+        return _compile_e, (self.spe, self.share)
+
+
+_PUSH = 0
+_PARAM = 1
+_APPLY = 2
+_JUMP_IF_FALSE = 3
+_JUMP = 4
+# these jump if the value on top of the stack fits, leaving it on the stack, or pop it otherwise
+_JUMP_IF_FALSE_OR_POP = 5
+_JUMP_IF_TRUE_OR_POP = 6
+_JUMP_IF_NOT_NONE_OR_POP = 7
+
+_jump_opcodes = (_JUMP_IF_FALSE, _JUMP, _JUMP_IF_FALSE_OR_POP, _JUMP_IF_TRUE_OR_POP, _JUMP_IF_NOT_NONE_OR_POP)
+
+
+class _Instruction:
+    __slots__ = ('opcode', 'arg', 'n')
+
+    def __init__(self, opcode: int, arg=None, n: int = 0):
+        # for _APPLY, n is the number of values popped from the stack
+        self.opcode = opcode
+        self.arg = arg
+        self.n = n
+
+
+class _Label:
+    # a position in the program that jump instructions can target
+    __slots__ = ('target',)
+
+    def __init__(self):
+        self.target = None
+
+
+class _LiteralEnd:
+    # a marker placed after the elements of a container literal
+    __slots__ = ('literal', 'elements', 'build', 'start')
+
+    def __init__(self, literal, elements: list, build: Callable[[list], Any], start: int):
+        self.literal = literal
+        self.elements = elements
+        self.build = build
+        self.start = start
+
+
+def _call(op, *args):
+    return op(*args)
+
+
+def _build_literal(build: Callable[[list], Any], *elements):
+    return build(list(elements))
+
+
+def _flatten(spe) -> tuple:
+    """
+    Flatten a value into a postfix program of (opcode, arg, n) instructions, to be run by _run. The tree is walked
+    with an explicit stack, so the expression's depth is unlimited.
+    """
+    program = []
+    jumps = []
+    work = [spe]
+    while work:
+        item = work.pop()
+        if isinstance(item, _Instruction):
+            if item.opcode in _jump_opcodes:
+                jumps.append(len(program))
+            program.append(item)
+        elif isinstance(item, _Label):
+            item.target = len(program)
+        elif isinstance(item, _LiteralEnd):
+            emitted = program[item.start:]
+            if len(emitted) == len(item.elements) \
+                    and all(i.opcode == _PUSH and i.arg is el for (i, el) in zip(emitted, item.elements)):
+                # no element is an expression, the literal is evaluated as itself
+                del program[item.start:]
+                program.append(_Instruction(_PUSH, item.literal))
+            else:
+                program.append(_Instruction(_APPLY, partial(_build_literal, item.build), len(item.elements)))
+        elif is_expression(item):
+            work.extend(reversed(item._postfix()))
+        else:
+            parts = _literal_parts(item)
+            if parts is None:
+                program.append(_Instruction(_PUSH, item))
+            else:
+                elements, build = parts
+                work.append(_LiteralEnd(item, elements, build, len(program)))
+                work.extend(reversed(elements))
+    for i in jumps:
+        program[i].arg = program[i].arg.target
+    return tuple((i.opcode, i.arg, i.n) for i in program)
+
+
+def _run(program: tuple, v):
+    stack = []
+    push = stack.append
+    pop = stack.pop
+    pc = 0
+    end = len(program)
+    while pc < end:
+        opcode, arg, n = program[pc]
+        pc += 1
+        if opcode == _APPLY:
+            if n == 1:
+                stack[-1] = arg(stack[-1])
+            elif n == 2:
+                rhs = pop()
+                stack[-1] = arg(stack[-1], rhs)
+            else:
+                args = stack[len(stack) - n:]
+                del stack[len(stack) - n:]
+                push(arg(*args))
+        elif opcode == _PUSH:
+            push(arg)
+        elif opcode == _PARAM:
+            push(v)
+        elif opcode == _JUMP_IF_FALSE:
+            if not pop():
+                pc = arg
+        elif opcode == _JUMP:
+            pc = arg
+        elif opcode == _JUMP_IF_FALSE_OR_POP:
+            if stack[-1]:
+                pop()
+            else:
+                pc = arg
+        elif opcode == _JUMP_IF_TRUE_OR_POP:
+            if stack[-1]:
+                pc = arg
+            else:
+                pop()
+        elif stack[-1] is None:  # _JUMP_IF_NOT_NONE_OR_POP
+            pop()
+        else:
+            pc = arg
+    return stack[0]
+
+
+class _Iterative(_Evaluated):
+    # evaluates a flattened program with a value stack instead of recursing through the expression
+    def __init__(self, spe):
+        self.spe = spe
+        self._program = _flatten(spe)
+
+    def __call__(self, v):
+        return _run(self._program, v)
+
+    def __reduce__(self):
+        return _Iterative, (self.spe,)
+
+
+def _interpret(spe) -> _Evaluated:
+    lowered = _lowered_e(spe)
+    if lowered is not None:
+        return lowered
+    try:
+        return _Evaluated(spe)
+    except RecursionError:
+        # the expression is too deep to be evaluated recursively
+        return _Iterative(spe)
+
+
+def _compile_e(spe, share: bool) -> _Evaluated:
+    lowered = _lowered_e(spe)
+    if lowered is not None:
+        return lowered
+    try:
+        shared = _SubexpressionCounter().shared(spe) if share else ()
+        func, source = _Compiler(shared).function(spe)
+    except (SyntaxError, RecursionError, MemoryError):
+        # the expression is too deep for the python compiler, fall back to the interpreter
+        return _interpret(spe)
+    return type(_Compiled.__name__, (_Compiled,), {'__call__': func})(spe, source, share)
+
+
+def _constants_immutable(value) -> bool:
+    # whether a value holds only hashable constants, so that a finalized expression of it can stand in for the finalized
+    # expressions of structurally equal values
+    if type(value) in _atomic_types:
+        return True
+    if is_expression(value):
+        if isinstance(value, Const):
+            return _constants_immutable(value._evaluate(None))
+        immutable = True
+
+        def check(operand):
+            nonlocal immutable
+            immutable = immutable and _constants_immutable(operand)
+            return operand
+
+        value._map(check)
+        return immutable
+    parts = _literal_parts(value)
+    if parts is None or not is_expression(_finalize(value)):
+        # a value with no expressions in it is used as is
+        try:
+            hash(value)
+        except TypeError:
+            return False
+        return True
+    return all(map(_constants_immutable, parts[0]))
+
+
+CacheInfo = namedtuple('CacheInfo', ('hits', 'misses', 'evictions', 'maxsize', 'currsize'))
+
+
+class _FinalizedCache:
+    # a thread-safe LRU cache of finalized expressions, by the structure of the expressions and the options of e
+    def __init__(self, maxsize: Optional[int]):
+        self.maxsize = maxsize
+        self.lock = RLock()
+        self.entries = OrderedDict()
+        self.hits = self.misses = self.evictions = 0
+
+    @staticmethod
+    def key(spe, options: tuple):
+        try:
+            if not _constants_immutable(spe):
+                return None
+            return StructuralKey(spe), options
+        except RecursionError:
+            # the expression is too deep to be hashed
+            return None
+
+    def get(self, key) -> Optional[_Evaluated]:
+        with self.lock:
+            ret = self.entries.get(key)
+            if ret is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.entries.move_to_end(key)
+            return ret
+
+    def put(self, key, finalized: _Evaluated):
+        with self.lock:
+            self.entries[key] = finalized
+            self.entries.move_to_end(key)
+            self.trim()
+
+    def trim(self):
+        while self.maxsize is not None and len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def info(self) -> CacheInfo:
+        with self.lock:
+            return CacheInfo(self.hits, self.misses, self.evictions, self.maxsize, len(self.entries))
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def resize(self, maxsize: Optional[int]):
+        with self.lock:
+            self.maxsize = maxsize
+            self.trim()
+
+
+_finalized_cache = _FinalizedCache(maxsize=1024)
+
+
+def e(spe, *, compile=False, optimize=False, iterative=False, share=True, profile=False, adaptive=False):
+    """
+    Finalize an expression into a single-parameter function.
+    Attributes, items and method calls of the parameter (with constant arguments), and tuples of attributes or items,
+    are evaluated by operator.attrgetter, itemgetter and methodcaller.
+
+    compile: generate a python function equivalent to the expression, instead of interpreting it on every call.
+        Unless share is false, structurally equal subexpressions that are evaluated unconditionally more than once
+        (and that only call callables known to be pure, see pure) are evaluated only once per call. The interpreter
+        does not share subexpressions, so the expression must be compiled to benefit from sharing.
+    optimize: evaluate the parts of the expression that do not depend on the parameter in advance, see optimize.
+    iterative: evaluate the expression with a value stack instead of recursion, for very deep expressions.
+    profile: record the evaluations of every node, available as the profile attribute of the returned function, see
+        expressive.profiling.Profile. Profiled expressions are interpreted.
+    adaptive: interpret the first calls, and then compile the expression, specialized (behind a type check) for the
+        type of the argument if it was always the same, see expressive.adaptive.adaptive. The other options are
+        ignored.
+
+    Compiled, optimized and iterative expressions are cached by the structure of the expression (unless it holds
+    unhashable constants), so finalizing a structurally equal expression with the same options returns the same
+    function, see e.cache_info, e.cache_clear and e.cache_resize.
+    """
     if isinstance(spe, _Evaluated):
-        return spe
-    return _Evaluated(spe)
+        if not optimize and not profile and not adaptive \
+                and (not compile or isinstance(spe, _Compiled)) \
+                and (not iterative or isinstance(spe, _Iterative)):
+            return spe
+        spe = spe.spe
+    if adaptive:
+        from expressive.adaptive import adaptive as adaptive_e
+        return adaptive_e(spe)
+    if profile or not (compile or optimize or iterative):
+        # interpreting an expression is cheaper than looking it up
+        return _finalize_e(spe, compile, optimize, iterative, share, profile)
+    key = _finalized_cache.key(spe, (compile, optimize, iterative, share))
+    if key is None:
+        return _finalize_e(spe, compile, optimize, iterative, share, profile)
+    ret = _finalized_cache.get(key)
+    if ret is None:
+        ret = _finalize_e(spe, compile, optimize, iterative, share, profile)
+        _finalized_cache.put(key, ret)
+    return ret
+
+
+e.cache_info = _finalized_cache.info
+e.cache_clear = _finalized_cache.clear
+e.cache_resize = _finalized_cache.resize
+
+
+def _finalize_e(spe, compile, optimize, iterative, share, profile) -> _Evaluated:
+    if optimize:
+        try:
+            spe = _fold(spe)[0]
+        except RecursionError:
+            # the expression is too deep to be optimized
+            pass
+    if profile:
+        from expressive.profiling import profiled
+        return profiled(spe)
+    if compile:
+        return _compile_e(spe, share=share)
+    if iterative:
+        return _Iterative(spe)
+    return _interpret(spe)
 
 
 def is_possible_expression(v):
     return evaluate.dispatch(type(v)) != evaluate.dispatch(object) \
            or hasattr(v, '_fields') \
-           or (is_dataclass(v) and not isinstance(v, type))
+           or hasattr(type(v), '__dataclass_fields__')
 
 
 def is_expression(v):
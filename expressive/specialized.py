@@ -1,5 +1,11 @@
+from collections import deque
 from functools import lru_cache, partial, singledispatch
-from itertools import filterfalse, takewhile, groupby, dropwhile
+from heapq import nlargest, nsmallest
+from itertools import filterfalse, takewhile, groupby, dropwhile, islice, chain
+from operator import add
+from os import cpu_count
+from pickle import dump, load, HIGHEST_PROTOCOL
+from tempfile import TemporaryFile
 
 try:
     from functools import cache
@@ -11,15 +17,19 @@ try:
 except ImportError:
     cached_property = None
 
-from expressive.single import e
+from expressive.single import StructuralKey, _Compiler, _SubexpressionCounter, _constants_immutable, _unfinalized, \
+    e
 
-__all__ = ['classmethod_e',
+__all__ = ['aggregate_e', 'argsort_e',
+           'classmethod_e',
            'dropwhile_e',
            'filter_e', 'filterfalse_e',
            'groupby_e',
+           'join_e',
            'list_sort_e', 'lru_cache_e',
            'map_e', 'max_e', 'min_e',
-           'partial_e', 'property_e',
+           'nlargest_e', 'nsmallest_e',
+           'partial_e', 'partial_sort_e', 'property_e',
            'singledispatch_e', 'singledispatch_register_e', 'sorted_e',
            'takewhile_e']
 
@@ -36,6 +46,187 @@ if cached_property:
         return cached_property(e(expression))
 
 
+def _keys(items: list, key) -> list:
+    # the keys of all the items, computed in one pass by the compiled key expression
+    return list(map(e(key, compile=True), items))
+
+
+@lru_cache(maxsize=None)
+def _numpy():
+    # numpy is optional, and only imported when needed
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def _numeric_argsort(keys: list, reverse: bool):
+    # a stable argsort of int or float keys with numpy, or None if the keys are not numeric or numpy is unavailable
+    np = _numpy()
+    if np is None:
+        return None
+    key_types = set(map(type, keys))
+    if key_types != {int} and key_types != {float}:
+        return None
+    array = np.asarray(keys)
+    if array.dtype.kind not in 'if':
+        # ints too large for a numpy integer
+        return None
+    if not reverse:
+        return np.argsort(array, kind='stable').tolist()
+    # sorting in reverse keeps equal keys in their original order, like sorted
+    last = len(keys) - 1
+    return [last - i for i in reversed(np.argsort(array[::-1], kind='stable').tolist())]
+
+
+def _first(a, b):
+    return a
+
+
+def _last(a, b):
+    return b
+
+
+def _mean(slots):
+    return slots[0] / slots[1]
+
+
+def _only(slots):
+    return slots[0]
+
+
+# each aggregation is made of slots and a function computing its result from them. Each slot has the source that
+# initializes it from the first value of a group, the source that updates it with each following value (where {a} is
+# the slot and {x} is the value), and a function that merges the slots of two chunks
+_aggregations = {
+    'sum': ([('{x}', '{a} = {a} + {x}', add)], _only),
+    'count': ([('int({x} is not None)', '{a} += {x} is not None', add)], _only),
+    'min': ([('{x}', 'if {x} < {a}: {a} = {x}', min)], _only),
+    'max': ([('{x}', 'if {x} > {a}: {a} = {x}', max)], _only),
+    'mean': ([('{x}', '{a} = {a} + {x}', add), ('1', '{a} += 1', add)], _mean),
+    'first': ([('{x}', '', _first)], _only),
+    'last': ([('{x}', '{a} = {x}', _last)], _only),
+}
+
+
+class _AggregateCompiler(_Compiler):
+    """
+    Lowers a key and aggregated values to the source of a single loop, that updates the slots of each item's group in
+    place.
+    """
+
+    def _sources(self, expressions: tuple) -> list:
+        try:
+            self._shared_names = {StructuralKey(s): None for s in _SubexpressionCounter().shared(expressions)}
+            return [self.operand(spe) for spe in expressions]
+        except RecursionError:
+            # the expressions are too deep to be compiled, call the finalized expressions instead
+            self._shared_names = {}
+            self.statements = []
+            return [self.const(e(spe)) + '(' + self.param + ')' for spe in expressions]
+
+    def aggregator(self, key, aggregations: tuple):
+        key_source, *value_sources = self._sources((key, *(spe for _, spe in aggregations)))
+        initial, updates = [], []
+        for i, (name, _) in enumerate(aggregations):
+            x = f'_x{i}'
+            for init, update, _ in _aggregations[name][0]:
+                initial.append(init.format(x=x))
+                if update:
+                    updates.append(update.format(x=x, a=f'_a[{len(initial) - 1}]'))
+        lines = ['def _aggregate(iterable, groups):',
+                 f'    for {self.param} in iterable:']
+        lines.extend('        ' + s for s in self.statements)
+        lines.append('        _k = ' + key_source)
+        lines.extend(f'        _x{i} = {source}' for (i, source) in enumerate(value_sources))
+        lines.append('        _a = groups.get(_k)')
+        lines.append('        if _a is None:')
+        lines.append('            groups[_k] = [' + ', '.join(initial) + ']')
+        lines.append('        else:')
+        lines.extend('            ' + u for u in updates or ['pass'])
+        lines.append('    return groups')
+        source = '\n'.join(lines) + '\n'
+        exec(compile(source, '<expressive>', 'exec'), self.namespace)
+        return self.namespace['_aggregate']
+
+
+@lru_cache(maxsize=256)
+def _cached_aggregator(key, aggregations: tuple):
+    return _AggregateCompiler().aggregator(key.value, tuple((name, spe.value) for (name, spe) in aggregations))
+
+
+def _aggregator(key, aggregations: tuple):
+    # the aggregators of expressions without mutable constants are shared by structurally equal aggregations
+    try:
+        if all(map(_constants_immutable, (key, *(spe for _, spe in aggregations)))):
+            return _cached_aggregator(StructuralKey(key),
+                                      tuple((name, StructuralKey(spe)) for (name, spe) in aggregations))
+    except RecursionError:
+        pass
+    return _AggregateCompiler().aggregator(key, aggregations)
+
+
+def _aggregate_chunk(spec: tuple, chunk: list) -> list:
+    return [_aggregator(*spec)(chunk, {})]
+
+
+def _merge_groups(groups: dict, other: dict, aggregations: tuple):
+    merges = [merge for (name, _) in aggregations for (_, _, merge) in _aggregations[name][0]]
+    for k, slots in other.items():
+        existing = groups.get(k)
+        if existing is None:
+            groups[k] = slots
+        else:
+            existing[:] = [merge(a, b) for (merge, a, b) in zip(merges, existing, slots)]
+
+
+def aggregate_e(iterable, key, *, executor=None, chunksize=1024, max_pending=None, **aggregations) -> dict:
+    """
+    Group the items of the iterable by the key in a single pass, without sorting them, and aggregate the values of
+    expressions over each group. Each keyword names an aggregation of the expression's values: sum, count (of the
+    values that are not None), min, max, mean, first or last. Returns a dict mapping each key, in the order they were
+    first seen, to a dict of the aggregations.
+
+    With an executor (a thread or process pool), the iterable is aggregated in chunks by the executor's workers,
+    whose groups are then merged, while keeping at most max_pending chunks in flight.
+    """
+    unknown = aggregations.keys() - _aggregations.keys()
+    if unknown:
+        raise TypeError(f'unknown aggregations: {", ".join(sorted(unknown))}')
+    # finalized expressions are compiled into the loop
+    key = _unfinalized(key)
+    aggregations = tuple((name, _unfinalized(spe)) for (name, spe) in aggregations.items())
+    if executor is None:
+        groups = _aggregator(key, aggregations)(iterable, {})
+    else:
+        groups = {}
+        for chunk_groups in _parallel(_aggregate_chunk, (key, aggregations), iterable, executor, chunksize,
+                                      max_pending):
+            _merge_groups(groups, chunk_groups, aggregations)
+    ret = {}
+    for k, slots in groups.items():
+        ret[k] = result = {}
+        i = 0
+        for name, _ in aggregations:
+            slot_specs, finalize = _aggregations[name]
+            result[name] = finalize(slots[i:i + len(slot_specs)])
+            i += len(slot_specs)
+    return ret
+
+
+def argsort_e(iterable, *, key, reverse=False) -> list:
+    """
+    The indices of the items of the iterable, in the order that sorting them by the key would put them. All the keys
+    are computed in a single batch first, numeric keys are sorted with numpy when it is available.
+    """
+    keys = _keys(list(iterable), key)
+    ret = _numeric_argsort(keys, reverse)
+    if ret is None:
+        ret = sorted(range(len(keys)), key=keys.__getitem__, reverse=reverse)
+    return ret
+
+
 def classmethod_e(expression):
     return classmethod(e(expression))
 
@@ -44,8 +235,48 @@ def dropwhile_e(expression, *args, **kwargs):
     return dropwhile(e(expression), *args, **kwargs)
 
 
-def filter_e(expression, *args, **kwargs):
-    return filter(e(expression), *args, **kwargs)
+def _map_chunk(func, chunk: list) -> list:
+    return list(map(func, chunk))
+
+
+def _filter_chunk(func, chunk: list) -> list:
+    return list(filter(func, chunk))
+
+
+def _stream(worker, func, chunks, executor, max_pending: int):
+    # submit chunks to the executor and yield their results in order, with at most max_pending chunks in flight
+    pending = deque()
+    try:
+        for chunk in chunks:
+            if len(pending) >= max_pending:
+                yield from pending.popleft().result()
+            pending.append(executor.submit(worker, func, chunk))
+        while pending:
+            yield from pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def _parallel(worker, func, iterable, executor, chunksize: int, max_pending):
+    if max_pending is None:
+        max_pending = 2 * (cpu_count() or 1)
+    if chunksize < 1 or max_pending < 1:
+        raise ValueError('chunksize and max_pending must be positive')
+    it = iter(iterable)
+    chunks = iter(lambda: list(islice(it, chunksize)), [])
+    return _stream(worker, func, chunks, executor, max_pending)
+
+
+def filter_e(expression, *args, executor=None, chunksize=1024, max_pending=None, **kwargs):
+    """
+    With an executor (a thread or process pool), the iterable is filtered in chunks by the executor's workers,
+    yielding the items in order, while keeping at most max_pending chunks in flight.
+    """
+    if executor is None:
+        return filter(e(expression), *args, **kwargs)
+    iterable, = args
+    return _parallel(_filter_chunk, e(expression), iterable, executor, chunksize, max_pending)
 
 
 def filterfalse_e(expression, *args, **kwargs):
@@ -56,6 +287,134 @@ def groupby_e(iterable, expression):
     return groupby(iterable, e(expression))
 
 
+_join_kinds = ('inner', 'left', 'semi', 'anti')
+
+
+def _probe_build_right(probe, build, how: str):
+    # probe (key, item) pairs of the left side against a hash table of the right side, in the order of the left side
+    table = {}
+    for k, r in build:
+        table.setdefault(k, []).append(r)
+    for k, l in probe:
+        matches = table.get(k)
+        if how == 'inner':
+            if matches:
+                for r in matches:
+                    yield l, r
+        elif how == 'left':
+            for r in matches or (None,):
+                yield l, r
+        elif (how == 'semi') == bool(matches):
+            yield l
+
+
+def _probe_build_left(probe, build, how: str):
+    # probe (key, item) pairs of the right side against a hash table of the left side, in the order of the right side,
+    # followed by the unmatched items of the left side
+    lefts = []
+    table = {}
+    for k, l in build:
+        table.setdefault(k, []).append(len(lefts))
+        lefts.append(l)
+    matched = bytearray(len(lefts))
+    for k, r in probe:
+        for i in table.get(k, ()):
+            if how in ('inner', 'left'):
+                yield lefts[i], r
+            elif how == 'semi' and not matched[i]:
+                yield lefts[i]
+            matched[i] = 1
+    if how == 'left':
+        for i, l in enumerate(lefts):
+            if not matched[i]:
+                yield l, None
+    elif how == 'anti':
+        for i, l in enumerate(lefts):
+            if not matched[i]:
+                yield l
+
+
+def _keyed(items, key):
+    func = e(key, compile=True)
+    return ((func(v), v) for v in items)
+
+
+def _spill(pairs, partitions: int) -> list:
+    # write (key, item) pairs to temporary files, partitioned by the hash of the key
+    files = []
+    try:
+        for _ in range(partitions):
+            files.append(TemporaryFile())
+        for pair in pairs:
+            dump(pair, files[hash(pair[0]) % partitions], HIGHEST_PROTOCOL)
+        for f in files:
+            f.seek(0)
+    except BaseException:
+        # the partitions written so far are removed when closed
+        for f in files:
+            f.close()
+        raise
+    return files
+
+
+def _unspill(f):
+    with f:
+        while True:
+            try:
+                yield load(f)
+            except EOFError:
+                return
+
+
+def _join(probe, build, how: str, build_left: bool, spill_threshold: int, partitions: int):
+    join = _probe_build_left if build_left else _probe_build_right
+    build = iter(build)
+    loaded = list(islice(build, spill_threshold + 1))
+    if len(loaded) <= spill_threshold:
+        yield from join(probe, loaded, how)
+        return
+    # the build side is too large to keep in memory, join each partition of both sides separately
+    build_files = _spill(chain(loaded, build), partitions)
+    del loaded
+    probe_files = []
+    try:
+        probe_files = _spill(probe, partitions)
+        for build_file, probe_file in zip(build_files, probe_files):
+            yield from join(_unspill(probe_file), list(_unspill(build_file)), how)
+    finally:
+        for f in chain(build_files, probe_files):
+            f.close()
+
+
+def join_e(left, right, *, left_key, right_key, how='inner', spill_threshold=1_000_000, partitions=16):
+    """
+    Join the items of two iterables whose keys are equal, by building a hash table of one side and streaming the
+    other. how is one of:
+    inner: yields (left item, right item) for every matching pair.
+    left: like inner, and also yields (left item, None) for every left item with no match.
+    semi: yields every left item with a match.
+    anti: yields every left item with no match.
+
+    The table is built of the smaller side if both sides have lengths, or of the right side otherwise. When it is
+    built of the left side, the unmatched left items are yielded last. If the build side has more than
+    spill_threshold items, both sides are partitioned by key into temporary files (so their items must be picklable),
+    and joined one partition at a time, in the order of the partitions.
+    """
+    if how not in _join_kinds:
+        raise ValueError(f'how must be one of {", ".join(_join_kinds)}')
+    if spill_threshold < 0 or partitions < 1:
+        raise ValueError('spill_threshold must not be negative, and partitions must be positive')
+    left_pairs = _keyed(left, left_key)
+    right_pairs = _keyed(right, right_key)
+    try:
+        build_left = len(left) < len(right)
+    except TypeError:
+        build_left = False
+    if build_left:
+        return _join(right_pairs, left_pairs, how, True, spill_threshold, partitions)
+    return _join(left_pairs, right_pairs, how, False, spill_threshold, partitions)
+
+
 def list_sort_e(self: list, *, key, **kwargs):
     return self.sort(key=e(key), **kwargs)
 
@@ -70,8 +429,15 @@ def lru_cache_e(maxsize=128, *args, **kwargs):
     return _lru_cache_inner(maxsize)
 
 
-def map_e(expression, *args, **kwargs):
-    return map(e(expression), *args, **kwargs)
+def map_e(expression, *args, executor=None, chunksize=1024, max_pending=None, **kwargs):
+    """
+    With an executor (a thread or process pool), the iterable is mapped in chunks by the executor's workers,
+    yielding the results in order, while keeping at most max_pending chunks in flight.
+    """
+    if executor is None:
+        return map(e(expression), *args, **kwargs)
+    iterable, = args
+    return _parallel(_map_chunk, e(expression), iterable, executor, chunksize, max_pending)
 
 
 def max_e(*args, key, **kwargs):
@@ -82,10 +448,29 @@ def min_e(*args, key, **kwargs):
     return min(*args, key=e(key), **kwargs)
 
 
+def nlargest_e(n, iterable, *, key):
+    return nlargest(n, iterable, key=e(key, compile=True))
+
+
+def nsmallest_e(n, iterable, *, key):
+    return nsmallest(n, iterable, key=e(key, compile=True))
+
+
 def partial_e(expression, arg):
     return partial(e(expression), arg)
 
 
+def partial_sort_e(self: list, n, *, key, reverse=False):
+    """
+    Sort the list in place only partially, so that its first n items are the n items that sorting it would put first,
+    in order, followed by the rest of the items in their original order.
+    """
+    keys = _keys(self, key)
+    first = (nlargest if reverse else nsmallest)(n, range(len(keys)), key=keys.__getitem__)
+    chosen = set(first)
+    self[:] = [self[i] for i in first] + [v for (i, v) in enumerate(self) if i not in chosen]
+
+
 def property_e(get_expression, doc=None):
     return property(fget=e(get_expression), doc=doc)
 
@@ -103,8 +488,16 @@ def singledispatch_register_e(self, cls, expression=None):
     return ret(expression)
 
 
-def sorted_e(*args, key, **kwargs):
-    return sorted(*args, key=e(key), **kwargs)
+def sorted_e(*args, key, batch=False, **kwargs):
+    """
+    With batch, all the keys are computed in a single batch first, numeric keys are sorted with numpy when it is
+    available.
+    """
+    if not batch:
+        return sorted(*args, key=e(key), **kwargs)
+    iterable, = args
+    items = list(iterable)
+    return [items[i] for i in argsort_e(items, key=key, **kwargs)]
 
 
 def takewhile_e(expression, *args, **kwargs):
@@ -0,0 +1,273 @@
+from __future__ import annotations
+
+import builtins
+import operator
+from typing import Iterator, List, Optional, Tuple
+
+from expressive.single import BinOp, UnOp, Call, GetItem, GetAttr, Const, _Parameter, e, is_expression
+from expressive.delayed import If, And, Or, Coalesce, In, Len, Not
+
+__all__ = ['to_sql', 'where', 'select', 'Record']
+
+_sql_comparisons = {'>=': '>=', '>': '>', '<=': '<=', '<': '<', '==': 'IS', '!=': 'IS NOT'}
+_sql_arithmetic = {'+': '+', '-': '-', '*': '*', '&': '&', '|': '|', '<<': '<<', '>>': '>>'}
+_sql_unary = {'-': '-', '+': '+', '~': '~'}
+_sql_types = (type(None), bool, int, float, str, bytes)
+_sql_functions = {id(Len): 'length', id(builtins.abs): 'abs', id(operator.abs): 'abs'}
+# the storage classes of the values of python types, and their names as returned by typeof
+_sql_classes = {type(None): 'null', bool: 'numeric', int: 'numeric', float: 'numeric', str: 'text', bytes: 'blob'}
+_sql_typeofs = {'numeric': "('integer', 'real')", 'text': "('text')", 'blob': "('blob')"}
+
+
+class _Untranslatable(Exception):
+    pass
+
+
+def _parts(node) -> tuple:
+    # the operands a node was constructed with
+    return node.__reduce__()[1]
+
+
+def _constant(v):
+    if isinstance(v, Const):
+        return v._evaluate(None)
+    if is_expression(v):
+        raise _Untranslatable(v)
+    return v
+
+
+def _identifier(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _is_predicate(v) -> bool:
+    # whether an expression always evaluates to a bool, so its truthiness means the same in python and in SQL
+    if type(v) is BinOp:
+        op_str, _, lhs, rhs = _parts(v)
+        return op_str in _sql_comparisons or (op_str in ('&', '|') and _is_predicate(lhs) and _is_predicate(rhs))
+    if type(v) is Call:
+        _, op, args, kwargs = _parts(v)
+        return (op is In or op is Not) and not kwargs
+    if type(v) in (And, Or):
+        return all(map(_is_predicate, _parts(v)))
+    return False
+
+
+def _kind(v) -> Optional[str]:
+    # the storage class of the values of an expression in SQL, or None if it depends on the types of columns
+    if _is_predicate(v):
+        return 'numeric'
+    if type(v) is BinOp:
+        op_str, _, lhs, rhs = _parts(v)
+        if op_str == '+' and 'text' in (_kind(lhs), _kind(rhs)):
+            return 'text'
+        # other arithmetic results are numbers (or python raises TypeError)
+        return 'numeric'
+    if type(v) in (UnOp, Call):
+        return 'numeric'
+    if type(v) in (Coalesce, If):
+        operands = _parts(v) if type(v) is Coalesce else _parts(v)[::2]
+        kinds = set(map(_kind, operands)) - {'null'}
+        return kinds.pop() if len(kinds) == 1 else None
+    if type(v) in (GetAttr, GetItem):
+        return None
+    return _sql_classes.get(type(_constant_or_none(v)))
+
+
+class _Translator:
+    def __init__(self):
+        self.params = []
+
+    def param(self, value) -> str:
+        if type(value) not in _sql_types:
+            raise _Untranslatable(value)
+        self.params.append(value)
+        return '?'
+
+    def value(self, v) -> str:
+        if type(v) in (GetAttr, GetItem):
+            parent, name = _parts(v)
+            if type(parent) is _Parameter and type(name) is str:
+                return _identifier(name)
+            raise _Untranslatable(v)
+        if _is_predicate(v):
+            return self.predicate(v)
+        if type(v) is BinOp:
+            return self.binary(*_parts(v))
+        if type(v) is UnOp:
+            op_str, _, inner = _parts(v)
+            if op_str not in _sql_unary:
+                raise _Untranslatable(v)
+            return '(' + _sql_unary[op_str] + self.value(inner) + ')'
+        if type(v) is Call:
+            return self.call(*_parts(v))
+        if type(v) is Coalesce:
+            return 'coalesce(' + ', '.join(map(self.value, _parts(v))) + ')'
+        if type(v) is If:
+            then, condition, otherwise = _parts(v)
+            return f'(CASE WHEN {self.predicate(condition)} THEN {self.value(then)} ELSE {self.value(otherwise)} END)'
+        return self.param(_constant(v))
+
+    def typed(self, v, kind: Optional[str]) -> str:
+        # a condition that a value of an unknown type is of the storage class of the values it is compared to, since
+        # SQLite converts the values of columns to the type of the other operand (by the column's affinity), but
+        # python never finds values of different types equal
+        if kind is None or kind == 'null':
+            return ''
+        return ' AND typeof(' + self.value(v) + ') IN ' + _sql_typeofs[kind]
+
+    def equality(self, op_str: str, lhs, rhs) -> str:
+        lhs_kind, rhs_kind = _kind(lhs), _kind(rhs)
+        if lhs_kind is None and rhs_kind is None:
+            # the types of both operands depend on the columns
+            raise _Untranslatable(op_str)
+        lhs_sql, rhs_sql = self.value(lhs), self.value(rhs)
+        guard = self.typed(lhs, rhs_kind) if lhs_kind is None else self.typed(rhs, lhs_kind) if rhs_kind is None else ''
+        if guard and op_str == '!=':
+            return '(NOT (' + lhs_sql + ' IS ' + rhs_sql + guard + '))'
+        return '(' + lhs_sql + ' ' + _sql_comparisons[op_str] + ' ' + rhs_sql + guard + ')'
+
+    def binary(self, op_str: str, op, lhs, rhs) -> str:
+        if op_str in ('==', '!='):
+            return self.equality(op_str, lhs, rhs)
+        if op_str in _sql_comparisons:
+            return '(' + self.value(lhs) + ' ' + _sql_comparisons[op_str] + ' ' + self.value(rhs) + ')'
+        kinds = {_kind(lhs), _kind(rhs)}
+        if op_str == '+' and 'text' in kinds and kinds <= {'text', None}:
+            return '(' + self.value(lhs) + ' || ' + self.value(rhs) + ')'
+        if op_str in ('+', '*') and kinds != {'numeric'} and (op_str == '*' or None in kinds):
+            # the operands may be sequences, that python concatenates or repeats
+            raise _Untranslatable(op_str)
+        if kinds & {'text', 'blob'}:
+            raise _Untranslatable(op_str)
+        if op_str == '/':
+            # python always divides as floats
+            return '(CAST(' + self.value(lhs) + ' AS REAL) / ' + self.value(rhs) + ')'
+        if op_str not in _sql_arithmetic:
+            raise _Untranslatable(op_str)
+        return '(' + self.value(lhs) + ' ' + _sql_arithmetic[op_str] + ' ' + self.value(rhs) + ')'
+
+    def call(self, cls, op, args, kwargs) -> str:
+        if kwargs:
+            raise _Untranslatable(kwargs)
+        if op is In:
+            item, container = args
+            container = _constant(container)
+            if type(container) not in (tuple, list, set, frozenset) or None in container:
+                raise _Untranslatable(container)
+            kinds = {_sql_classes.get(type(value)) for value in container}
+            if len(kinds) > 1 and _kind(item) is None:
+                # a column's value could be converted to be equal to a value of any of the types
+                raise _Untranslatable(container)
+            condition = self.value(item) + ' IN (' + ', '.join(map(self.param, container)) + ')'
+            if _kind(item) is None and kinds:
+                condition += self.typed(item, kinds.pop())
+            return '(' + condition + ')'
+        if id(op) in _sql_functions and len(args) == 1:
+            return _sql_functions[id(op)] + '(' + self.value(args[0]) + ')'
+        raise _Untranslatable(op)
+
+    def predicate(self, v) -> str:
+        # a condition, whose truthiness must match the truthiness of the expression in python
+        if not _is_predicate(v):
+            raise _Untranslatable(v)
+        if type(v) in (And, Or):
+            keyword = ' AND ' if type(v) is And else ' OR '
+            return '(' + keyword.join(map(self.predicate, _parts(v))) + ')'
+        if type(v) is BinOp:
+            op_str, _, lhs, rhs = _parts(v)
+            if op_str in ('&', '|'):
+                keyword = ' AND ' if op_str == '&' else ' OR '
+                return '(' + self.predicate(lhs) + keyword + self.predicate(rhs) + ')'
+            return self.binary(*_parts(v))
+        _, op, args, _ = _parts(v)
+        if op is Not:
+            inner, = args
+            return '(NOT ' + self.predicate(inner) + ')'
+        return self.call(Call, op, args, {})
+
+
+def _constant_or_none(v):
+    try:
+        return _constant(v)
+    except _Untranslatable:
+        return None
+
+
+def to_sql(expression) -> Tuple[str, list]:
+    """
+    Translate a predicate into a parameterized SQL condition, with the parameters to bind to its placeholders.
+    Attributes and items of the parameter are columns. Raises ValueError if the predicate cannot be translated.
+
+    NULL values are compared like None in python by == and !=, and as in SQL by the other operators. Values of
+    different types are never equal, as in python. The predicate is translated only where SQL finds the same values as
+    python, or where python would raise TypeError instead: SQL orders values of different types, and does arithmetic
+    on strings, where python raises. Comparing two values whose types both depend on columns for equality, and adding
+    or multiplying values that may be strings, are not translated.
+    """
+    translator = _Translator()
+    try:
+        return translator.predicate(expression), translator.params
+    except (_Untranslatable, ValueError):
+        raise ValueError(f'cannot translate {expression!r} to SQL') from None
+
+
+def _conjuncts(expression) -> list:
+    if type(expression) is And:
+        return [c for operand in _parts(expression) for c in _conjuncts(operand)]
+    if type(expression) is BinOp:
+        op_str, _, lhs, rhs = _parts(expression)
+        if op_str == '&' and _is_predicate(lhs) and _is_predicate(rhs):
+            return _conjuncts(lhs) + _conjuncts(rhs)
+    return [expression]
+
+
+def where(expression) -> Tuple[Optional[str], list, Optional[object]]:
+    """
+    Split a predicate into a parameterized SQL condition made of the conjuncts that can be translated, its parameters,
+    and a predicate of the remaining conjuncts to evaluate in python. The condition or the remaining predicate are
+    None if there are no such conjuncts.
+    """
+    conditions, params, remaining = [], [], []
+    for conjunct in _conjuncts(expression):
+        try:
+            condition, condition_params = to_sql(conjunct)
+        except ValueError:
+            remaining.append(conjunct)
+        else:
+            conditions.append(condition)
+            params.extend(condition_params)
+    condition = ' AND '.join(conditions) if conditions else None
+    if len(remaining) > 1:
+        return condition, params, And(*remaining)
+    return condition, params, (remaining[0] if remaining else None)
+
+
+class Record(dict):
+    """
+    A row, whose columns are available both as items and as attributes.
+    """
+
+    def __getattr__(self, item):
+        try:
+            return self[item]
+        except KeyError:
+            raise AttributeError(item) from None
+
+
+def select(connection, table: str, expression, columns: List[str] = None) -> Iterator[Record]:
+    """
+    Query the rows of a table (of an sqlite3 or other DB-API connection with qmark parameters) that match a predicate,
+    filtering by as much of the predicate as possible in the database.
+    """
+    condition, params, remaining = where(expression)
+    query = 'SELECT ' + (', '.join(map(_identifier, columns)) if columns else '*') + ' FROM ' + _identifier(table)
+    if condition is not None:
+        query += ' WHERE ' + condition
+    cursor = connection.cursor()
+    cursor.execute(query, params)
+    names = [d[0] for d in cursor.description]
+    rows = (Record(zip(names, row)) for row in cursor)
+    if remaining is None:
+        return rows
+    return filter(e(remaining), rows)
@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+from functools import lru_cache
+from itertools import islice, dropwhile
+from typing import Iterable, Iterator, List, Tuple
+
+from expressive.single import StructuralKey, _Compiler, _SubexpressionCounter, _constants_immutable, _unfinalized, \
+    e
+
+__all__ = ['Stream']
+
+_MAP = 'map'
+_FILTER = 'filter'
+_TAKEWHILE = 'takewhile'
+_DROPWHILE = 'dropwhile'
+_TAKE = 'take'
+
+# the stages that are fused into a single loop
+_fused_kinds = (_MAP, _FILTER, _TAKEWHILE)
+
+
+class _FusedCompiler(_Compiler):
+    """
+    Lowers consecutive map, filter and takewhile stages to the source of a single generator, whose loop evaluates all
+    the stages for each item. Constants are shared between the stages.
+    """
+
+    def stage(self, spe) -> Tuple[List[str], str]:
+        # the statements evaluating the shared subexpressions of a stage, and the source of its value
+        try:
+            self._shared_names = {StructuralKey(s): None for s in _SubexpressionCounter().shared(spe)}
+            self.statements = []
+            return self.statements, self.operand(spe)
+        except RecursionError:
+            # the expression is too deep to be compiled, call the finalized expression instead
+            self._shared_names = {}
+            self.statements = []
+            return [], self.const(e(spe)) + '(' + self.param + ')'
+
+    def generator(self, stages) -> Tuple[object, str]:
+        lines = ['def _fused(iterable):',
+                 f'    for {self.param} in iterable:']
+        for kind, spe in stages:
+            statements, source = self.stage(spe)
+            lines.extend('        ' + s for s in statements)
+            if kind == _MAP:
+                lines.append(f'        {self.param} = {source}')
+            elif kind == _FILTER:
+                lines.append(f'        if not {source}:')
+                lines.append('            continue')
+            else:
+                lines.append(f'        if not {source}:')
+                lines.append('            return')
+        lines.append(f'        yield {self.param}')
+        source = '\n'.join(lines) + '\n'
+        exec(compile(source, '<expressive>', 'exec'), self.namespace)
+        return self.namespace['_fused'], source
+
+
+@lru_cache(maxsize=256)
+def _cached_generator(keys: tuple):
+    return _FusedCompiler().generator([(kind, key.value) for kind, key in keys])[0]
+
+
+def _generator(stages: list):
+    # the fused generators of stages without mutable constants are shared by structurally equal pipelines
+    try:
+        if all(_constants_immutable(spe) for _, spe in stages):
+            return _cached_generator(tuple((kind, StructuralKey(spe)) for kind, spe in stages))
+    except RecursionError:
+        pass
+    return _FusedCompiler().generator(stages)[0]
+
+
+def _fuse(stages) -> list:
+    # groups the stages into runs of fusable stages (whose finalized expressions are compiled into the run), and the
+    # other stages
+    ret = []
+    for kind, arg in stages:
+        if kind in _fused_kinds:
+            arg = _unfinalized(arg)
+        if kind in _fused_kinds and ret and ret[-1][0] is None:
+            ret[-1][1].append((kind, arg))
+        elif kind in _fused_kinds:
+            ret.append((None, [(kind, arg)]))
+        else:
+            ret.append((kind, arg))
+    return ret
+
+
+class Stream:
+    """
+    A lazy pipeline of expressions over an iterable. Consecutive map, filter and takewhile stages are fused and
+    compiled into a single loop, that evaluates all of them for each item. The iterable is only consumed by iterating
+    the stream, or by its terminal operations: to_list, sorted and first.
+    """
+
+    def __init__(self, iterable: Iterable, _stages: tuple = ()):
+        self._iterable = iterable
+        self._stages = _stages
+
+    def _then(self, kind: str, arg) -> Stream:
+        return Stream(self._iterable, self._stages + ((kind, arg),))
+
+    def map(self, expression) -> Stream:
+        return self._then(_MAP, expression)
+
+    def filter(self, expression) -> Stream:
+        return self._then(_FILTER, expression)
+
+    def takewhile(self, expression) -> Stream:
+        return self._then(_TAKEWHILE, expression)
+
+    def dropwhile(self, expression) -> Stream:
+        return self._then(_DROPWHILE, expression)
+
+    def take(self, n: int) -> Stream:
+        if n < 0:
+            raise ValueError('n must not be negative')
+        return self._then(_TAKE, n)
+
+    def _sources(self) -> List[str]:
+        # the generated source of each fused run of stages
+        return [_FusedCompiler().generator(arg)[1] for kind, arg in _fuse(self._stages) if kind is None]
+
+    def __iter__(self) -> Iterator:
+        it = iter(self._iterable)
+        for kind, arg in _fuse(self._stages):
+            if kind is None:
+                it = _generator(arg)(it)
+            elif kind == _DROPWHILE:
+                it = dropwhile(e(arg), it)
+            else:
+                it = islice(it, arg)
+        return it
+
+    def to_list(self) -> list:
+        return list(self)
+
+    def sorted(self, key=None, reverse=False) -> list:
+        return sorted(self, key=None if key is None else e(key), reverse=reverse)
+
+    def first(self, default=None):
+        return next(iter(self), default)
+
+    def __repr__(self):
+        return 'Stream(' + repr(self._iterable) + ')' + ''.join(f'.{kind}({arg!r})' for kind, arg in self._stages)
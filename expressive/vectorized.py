@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import builtins
+import math
+import operator
+from typing import Mapping
+
+import numpy as np
+
+from expressive.single import _Compiler
+
+__all__ = ['vectorize']
+
+# scalar functions that have elementwise numpy counterparts
+_numpy_equivalents = {
+    builtins.abs: np.abs,
+    operator.abs: np.abs,
+    math.floor: np.floor,
+    math.ceil: np.ceil,
+    math.trunc: np.trunc,
+    builtins.round: np.round,
+    builtins.pow: np.power,
+    operator.pow: np.power,
+    builtins.divmod: np.divmod,
+    operator.not_: np.logical_not,
+    math.sqrt: np.sqrt,
+    math.exp: np.exp,
+    math.log: np.log,
+    math.isnan: np.isnan,
+    operator.add: np.add,
+    operator.sub: np.subtract,
+    operator.mul: np.multiply,
+    operator.truediv: np.true_divide,
+    operator.floordiv: np.floor_divide,
+    operator.mod: np.remainder,
+    operator.matmul: np.matmul,
+    operator.lshift: np.left_shift,
+    operator.rshift: np.right_shift,
+    operator.or_: np.bitwise_or,
+    operator.and_: np.bitwise_and,
+    operator.xor: np.bitwise_xor,
+    operator.ge: np.greater_equal,
+    operator.gt: np.greater,
+    operator.le: np.less_equal,
+    operator.lt: np.less,
+    operator.eq: np.equal,
+    operator.ne: np.not_equal,
+    operator.invert: np.invert,
+    operator.neg: np.negative,
+    operator.pos: np.positive,
+}
+
+
+class _VectorCompiler(_Compiler):
+    def const(self, value) -> str:
+        try:
+            value = _numpy_equivalents.get(value, value)
+        except TypeError:
+            # unhashable values are never functions we can replace
+            pass
+        return super().const(value)
+
+    def lazy_operand(self, value) -> str:
+        # when evaluating over arrays, all the elements of both branches are evaluated
+        return self.operand(value)
+
+    def short_circuit(self, keyword: str, operands) -> str:
+        func = self.const(np.logical_and if keyword == 'and' else np.logical_or)
+        first, *rest = operands
+        ret = self.operand(first)
+        for operand in rest:
+            ret = func + '(' + ret + ', ' + self.operand(operand) + ')'
+        return ret
+
+    def conditional(self, then, condition, otherwise) -> str:
+        return self.const(np.where) + '(' + self.operand(condition) + ', ' + self.operand(then) + ', ' \
+               + self.operand(otherwise) + ')'
+
+
+class _Columns:
+    # allow accessing the columns of a mapping both as items and as attributes
+    __slots__ = ('_columns',)
+
+    def __init__(self, columns: Mapping):
+        self._columns = columns
+
+    def __getattr__(self, item):
+        try:
+            return self._columns[item]
+        except KeyError:
+            raise AttributeError(item) from None
+
+    def __getitem__(self, item):
+        return self._columns[item]
+
+    def __len__(self):
+        return len(self._columns)
+
+    def __iter__(self):
+        return iter(self._columns)
+
+
+def vectorize(spe):
+    """
+    Create a function that evaluates the expression over numpy arrays, operating on all the elements at once.
+    If the argument is a mapping (such as a dict of columns), its values can be accessed by attribute as well.
+    """
+    try:
+        func, _ = _VectorCompiler().function(spe)
+    except (SyntaxError, RecursionError, MemoryError) as err:
+        raise ValueError('the expression is too deep to be vectorized') from err
+
+    def ret(v):
+        if isinstance(v, Mapping):
+            v = _Columns(v)
+        return func(None, v)
+
+    return ret
@@ -0,0 +1,15 @@
+from expressive import _, Len
+
+from tests.benchmarking.util import Benchmark
+
+bm = Benchmark('construction')
+
+
+@bm.measure('expression', highlight=True)
+def expression():
+    return (_.a + 1) * Len(_.b) > 3
+
+
+@bm.measure('lambda')
+def lambda_():
+    return lambda x: (x.a + 1) * len(x.b) > 3
@@ -0,0 +1,42 @@
+from types import SimpleNamespace
+
+from expressive import _, e, Len, If, Coalesce
+
+from tests.benchmarking.util import Benchmark
+
+bm = Benchmark('delayed builtins')
+
+v = SimpleNamespace(a=None, b=[1, 2, 3], c=-2)
+length = e(Len(_.b))
+conditional = e(If(_.c, _.c > 0, -_.c))
+coalesce = e(Coalesce(_.a, _.c))
+
+
+@bm.measure('Len', source=(9, ...), highlight=True)
+def len_expression():
+    length(v)
+
+
+@bm.measure('len, lambda')
+def len_lambda():
+    (lambda x: len(x.b))(v)
+
+
+@bm.measure('If', source=(10, ...), highlight=True)
+def if_expression():
+    conditional(v)
+
+
+@bm.measure('conditional, lambda')
+def if_lambda():
+    (lambda x: x.c if x.c > 0 else -x.c)(v)
+
+
+@bm.measure('Coalesce', source=(11, ...), highlight=True)
+def coalesce_expression():
+    coalesce(v)
+
+
+@bm.measure('coalesce, lambda')
+def coalesce_lambda():
+    (lambda x: x.a if x.a is not None else x.c)(v)
@@ -0,0 +1,63 @@
+from operator import attrgetter
+from types import SimpleNamespace
+
+from expressive import _, e, Len
+
+from tests.benchmarking.util import Benchmark
+
+bm = Benchmark('evaluation')
+
+v = SimpleNamespace(a=3, b='hello')
+spe = (_.a + 1) * Len(_.b) > 3
+interpreted = e(spe)
+compiled = e(spe, compile=True)
+iterative = e(spe, iterative=True)
+by_lambda = lambda x: (x.a + 1) * len(x.b) > 3  # noqa: E731
+get_a = e(_.a)
+get_a_compiled = e(_.a, compile=True)
+a_getter = attrgetter('a')
+
+
+@bm.measure('interpreted', source=(10, 11, ...))
+def evaluate_interpreted():
+    interpreted(v)
+
+
+@bm.measure('compiled', source=(10, 12, ...), highlight=True)
+def evaluate_compiled():
+    compiled(v)
+
+
+@bm.measure('iterative', source=(10, 13, ...))
+def evaluate_iterative():
+    iterative(v)
+
+
+@bm.measure('lambda', source=(14, ...))
+def evaluate_lambda():
+    by_lambda(v)
+
+
+@bm.measure('attribute, interpreted', source=(15, ...))
+def attribute_interpreted():
+    get_a(v)
+
+
+@bm.measure('attribute, compiled', source=(16, ...))
+def attribute_compiled():
+    get_a_compiled(v)
+
+
+@bm.measure('attribute, attrgetter', source=(17, ...))
+def attribute_attrgetter():
+    a_getter(v)
+
+
+adaptive = e(spe, adaptive=True)
+for _i in range(100):
+    adaptive(v)
+
+
+@bm.measure('adaptive, specialized')
+def evaluate_adaptive():
+    adaptive(v)
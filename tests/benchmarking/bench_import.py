@@ -0,0 +1,28 @@
+import subprocess
+import sys
+
+from tests.benchmarking.util import Benchmark
+
+bm = Benchmark('import')
+# every run starts a new interpreter
+bm.min_runs = 10
+bm.samples = 5
+
+
+def run(code):
+    subprocess.run([sys.executable, '-c', code], check=True)
+
+
+@bm.measure('interpreter startup')
+def startup():
+    run('pass')
+
+
+@bm.measure('import expressive', highlight=True)
+def import_expressive():
+    run('import expressive')
+
+
+@bm.measure('import expressive and a delayed builtin')
+def import_delayed():
+    run('from expressive import _, e, Len')
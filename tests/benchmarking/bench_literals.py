@@ -0,0 +1,25 @@
+from expressive import _, e
+
+from tests.benchmarking.util import Benchmark
+
+bm = Benchmark('container literals')
+
+v = {'a': 1, 'b': 2, 'c': [3, 4]}
+interpreted = e({'x': [_['a'], _['b'], 3], 'y': (_['c'], 'const')})
+compiled = e({'x': [_['a'], _['b'], 3], 'y': (_['c'], 'const')}, compile=True)
+by_lambda = lambda x: {'x': [x['a'], x['b'], 3], 'y': (x['c'], 'const')}  # noqa: E731
+
+
+@bm.measure('interpreted', source=(7, ...))
+def literal_interpreted():
+    interpreted(v)
+
+
+@bm.measure('compiled', source=(8, ...), highlight=True)
+def literal_compiled():
+    compiled(v)
+
+
+@bm.measure('lambda', source=(9, ...))
+def literal_lambda():
+    by_lambda(v)
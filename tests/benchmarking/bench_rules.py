@@ -0,0 +1,45 @@
+from random import Random
+from types import SimpleNamespace
+
+from expressive import _, e
+from expressive.rules import ExpressionSet, RuleIndex
+
+from tests.benchmarking.util import Benchmark
+
+bm = Benchmark('rules')
+
+_random = Random(0)
+countries = ['DE', 'FR', 'US', 'IL', 'JP']
+rules = [(_.payload.user.country == _random.choice(countries)) & (_.payload.amount > _random.randrange(100))
+         for _i in range(1000)]
+rule_set = ExpressionSet(rules)
+finalized = [e(rule, compile=True) for rule in rules]
+event = SimpleNamespace(payload=SimpleNamespace(user=SimpleNamespace(country='DE'), amount=50))
+
+
+@bm.measure('ExpressionSet.matches', highlight=True)
+def set_matches():
+    rule_set.matches(event)
+
+
+@bm.measure('compiled rules')
+def compiled_matches():
+    [i for (i, rule) in enumerate(finalized) if rule(event)]
+
+
+types = ['click', 'view', 'buy', 'scroll']
+typed_rules = [(_.type == _random.choice(types)) & (_.country == _random.choice(countries))
+               & (_.amount > _random.randrange(100)) for _i in range(5000)]
+typed_rule_set = ExpressionSet(typed_rules)
+typed_rule_index = RuleIndex(typed_rules)
+typed_event = SimpleNamespace(type='click', country='DE', amount=50)
+
+
+@bm.measure('RuleIndex.matches', highlight=True)
+def index_matches():
+    typed_rule_index.matches(typed_event)
+
+
+@bm.measure('ExpressionSet.matches, typed rules')
+def typed_set_matches():
+    typed_rule_set.matches(typed_event)
@@ -0,0 +1,86 @@
+from operator import itemgetter
+
+from expressive import _
+from expressive.specialized import sorted_e, filter_e, map_e, nlargest_e, aggregate_e, groupby_e
+from expressive.stream import Stream
+
+from tests.benchmarking.util import Benchmark
+
+bm = Benchmark('specialized')
+
+items = [(i * 7919 % 1000, str(i)) for i in range(1000)]
+
+
+@bm.measure('sorted_e', highlight=True)
+def sort_expression():
+    sorted_e(items, key=_[0])
+
+
+@bm.measure('sorted_e, batch')
+def sort_expression_batch():
+    sorted_e(items, key=_[0], batch=True)
+
+
+@bm.measure('nlargest_e', highlight=True)
+def nlargest_expression():
+    nlargest_e(10, items, key=_[0])
+
+
+@bm.measure('sorted_e, top 10')
+def sort_top():
+    sorted_e(items, key=_[0], reverse=True)[:10]
+
+
+@bm.measure('sorted, lambda')
+def sort_lambda():
+    sorted(items, key=lambda x: x[0])
+
+
+@bm.measure('sorted, itemgetter')
+def sort_itemgetter():
+    sorted(items, key=itemgetter(0))
+
+
+@bm.measure('filter_e', highlight=True)
+def filter_expression():
+    list(filter_e(_[0] > 500, items))
+
+
+@bm.measure('filter, lambda')
+def filter_lambda():
+    list(filter(lambda x: x[0] > 500, items))
+
+
+@bm.measure('map_e', highlight=True)
+def map_expression():
+    list(map_e(_[1], items))
+
+
+@bm.measure('map, itemgetter')
+def map_itemgetter():
+    list(map(itemgetter(1), items))
+
+
+@bm.measure('Stream, filter and map', highlight=True)
+def stream_filter_map():
+    Stream(items).filter(_[0] > 500).map(_[1]).filter(_ != '7').to_list()
+
+
+@bm.measure('filter_e and map_e')
+def stacked_filter_map():
+    list(filter_e(_ != '7', map_e(_[1], filter_e(_[0] > 500, items))))
+
+
+@bm.measure('generator expression')
+def generator_filter_map():
+    [y for y in (x[1] for x in items if x[0] > 500) if y != '7']
+
+
+@bm.measure('aggregate_e', highlight=True)
+def aggregate_expression():
+    aggregate_e(items, _[0] % 10, count=_[1], max=_[0])
+
+
+@bm.measure('sorted_e and groupby_e')
+def sort_groupby():
+    {k: len(list(g)) for (k, g) in groupby_e(sorted_e(items, key=_[0] % 10), _[0] % 10)}
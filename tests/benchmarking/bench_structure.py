@@ -0,0 +1,29 @@
+from expressive import _, Len, If
+from expressive.single import _eq_
+
+from tests.benchmarking.util import Benchmark
+
+bm = Benchmark('comparison and repr')
+
+
+def build():
+    return If((_.a + 1) * Len(_.b), _.c > 3, [_.d, {'k': -_.e}])
+
+
+first = build()
+second = build()
+
+
+@bm.measure('equal trees', source=(build, 13, 14, ...))
+def equal_trees():
+    _eq_(first, second)
+
+
+@bm.measure('identical trees', source=(build, 13, ...))
+def identical_trees():
+    _eq_(first, first)
+
+
+@bm.measure('repr', source=(build, 13, ...))
+def repr_():
+    repr(first)
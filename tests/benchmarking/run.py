@@ -0,0 +1,70 @@
+"""
+Run the benchmarks, write their results as json, and compare them to a baseline:
+
+    python -m tests.benchmarking.run --output results.json --baseline tests/benchmarking/baseline.json
+
+The exit code is 1 if any usage's median time regressed by more than the tolerance.
+"""
+import json
+import sys
+from argparse import ArgumentParser
+from importlib import import_module
+from pathlib import Path
+from typing import Dict, List
+
+from tests.benchmarking.util import Benchmark
+
+benchmark_dir = Path(__file__).parent
+
+
+def run_all(pattern='bench_*.py') -> Dict[str, dict]:
+    ret = {}
+    for bench_path in sorted(benchmark_dir.glob(pattern)):
+        mod = import_module('tests.benchmarking.' + bench_path.with_suffix('').name)
+        bm: Benchmark = mod.bm
+        print(bm.summary(), file=sys.stderr)
+        ret[bm.name] = bm.to_json()
+    return ret
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float) -> List[str]:
+    """
+    The usages whose median time is slower than in the baseline by more than the tolerance (a fraction).
+    """
+    regressions = []
+    for bench_name, measures in results.items():
+        for name, measure in measures.items():
+            base = baseline.get(bench_name, {}).get(name)
+            if base is None:
+                continue
+            ratio = measure['p50'] / base['p50']
+            if ratio > 1 + tolerance:
+                regressions.append(f'{bench_name}: {name}: {ratio:.2f}x slower than the baseline')
+    return regressions
+
+
+def main(argv=None):
+    parser = ArgumentParser(description='run the benchmarks')
+    parser.add_argument('--pattern', default='bench_*.py')
+    parser.add_argument('--output', type=Path, help='a json file to write the results to')
+    parser.add_argument('--baseline', type=Path, help='a json file of earlier results to compare to')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='the slowdown to allow, as a fraction')
+    parser.add_argument('--update-baseline', action='store_true', help='write the results to the baseline file')
+    args = parser.parse_args(argv)
+
+    results = run_all(args.pattern)
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+    regressions = []
+    if args.baseline:
+        if args.update_baseline:
+            args.baseline.write_text(json.dumps(results, indent=2))
+        elif args.baseline.exists():
+            regressions = compare(results, json.loads(args.baseline.read_text()), args.tolerance)
+    for regression in regressions:
+        print(regression, file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
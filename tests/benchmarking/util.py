@@ -1,9 +1,22 @@
-from dataclasses import dataclass
+import os
+import tracemalloc
+from dataclasses import dataclass, field
 from inspect import getmodule, getsourcelines, getsource
 from operator import attrgetter
 from textwrap import indent
-from time import process_time
-from typing import List
+from time import perf_counter
+from typing import List, Dict
+
+# the time to spend measuring each usage, in seconds
+default_max_time = float(os.environ.get('EXPRESSIVE_BENCHMARK_TIME', 1))
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    # linearly interpolated between the closest ranks
+    position = (len(sorted_values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
 
 
 @dataclass
@@ -12,9 +25,17 @@ class Measure:
     hertz: float
     code: str
     highlight: bool = False
+    # seconds per run
+    percentiles: Dict[str, float] = field(default_factory=dict)
+    # peak memory allocated by a single run, in bytes
+    peak_memory: int = 0
 
     def summary(self):
-        return f'{self.name}: {self.hertz:,.0f}'
+        return f'{self.name}: {self.hertz:,.0f} (p90 {self.percentiles["p90"] * 1e6:,.2f} us, ' \
+               f'peak {self.peak_memory:,} B)'
+
+    def to_json(self) -> dict:
+        return {'hertz': self.hertz, 'peak_memory': self.peak_memory, **self.percentiles}
 
     def rst_tuple(self):
         name = self.name
@@ -30,7 +51,10 @@ class Benchmark:
         self.name = name
         self.measures: List[Measure] = []
         self.min_runs = 100
-        self.max_time = 1
+        self.max_time = default_max_time
+        self.warmup_time = self.max_time / 10
+        # each sample times a batch of runs, so that the timer's resolution does not matter
+        self.samples = 30
 
     def measure(self, name: str = ..., source=(...,), highlight=False):
         def ret(func):
@@ -61,24 +85,50 @@ class Benchmark:
                     code_parts.append(''.join(mod_code[start:end]))
             code = "\n\n".join(code_parts)
 
-            start_time = process_time()
-            runs = 0
-            while True:
-                func()
-                runs += 1
-                elapsed = process_time() - start_time
-                if elapsed > self.max_time and runs >= self.min_runs:
-                    break
-            self.measures.append(Measure(name=name, hertz=runs / elapsed, code=code, highlight=highlight))
+            batch = self._warm_up(func)
+            times = []
+            deadline = perf_counter() + self.max_time
+            while len(times) < self.samples or perf_counter() < deadline:
+                start_time = perf_counter()
+                for _ in range(batch):
+                    func()
+                times.append((perf_counter() - start_time) / batch)
+            times.sort()
+            median = percentile(times, 0.5)
+
+            tracemalloc.start()
+            func()
+            peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            self.measures.append(Measure(
+                name=name, hertz=1 / median, code=code, highlight=highlight, peak_memory=peak_memory,
+                percentiles={f'p{p}': percentile(times, p / 100) for p in (10, 25, 50, 75, 90, 99)}
+            ))
             return func
 
         return ret
 
+    def _warm_up(self, func) -> int:
+        # run the function for a while, returning the size of a batch of runs that should be timed together
+        runs = 0
+        start_time = perf_counter()
+        while True:
+            func()
+            runs += 1
+            elapsed = perf_counter() - start_time
+            if elapsed > self.warmup_time and runs >= self.min_runs / 10:
+                break
+        return max(1, int(runs * self.max_time / elapsed / self.samples))
+
     def summary(self):
         parts = [f'{self.name}:']
         parts.extend(('\t' + m.summary()) for m in self.measures)
         return '\n'.join(parts)
 
+    def to_json(self) -> dict:
+        return {m.name: m.to_json() for m in self.measures}
+
     def rst(self):
         ret = [
             self.name,
@@ -0,0 +1,62 @@
+import pickle
+from collections.abc import Sized
+
+from pytest import raises
+
+from expressive import _, e, If, IsInstance, Len, Str, Type
+from expressive.adaptive import adaptive
+
+describe = If(_ * 2, IsInstance(_, (int, float)), Len(Str(_))) + If(1, Type(_) == str, 0)
+
+
+def expected(v):
+    return (v * 2 if isinstance(v, (int, float)) else len(str(v))) + (1 if type(v) == str else 0)
+
+
+def test_specialized():
+    f = adaptive(describe, warmup_calls=3, max_guard_misses=3)
+    for v in range(3):
+        assert f.tier == 'interpreted'
+        assert f(v) == expected(v)
+    assert f.tier == 'specialized'
+    assert repr(f.specialized) == '_ * 2 + Const(0)'
+    assert f(5) == 10
+    # arguments of other types fail the guard and are interpreted, until the expression is deoptimized
+    for v in ['abc', True, 2.5]:
+        assert f(v) == expected(v)
+    assert f.tier == 'compiled'
+    assert f(7) == 14
+    assert f('ab') == 3
+
+
+def test_polymorphic():
+    f = e(describe, adaptive=True)
+    assert repr(f) == f'e({describe!r}, adaptive=True)'
+    values = ['a', 1, 2.5, [1]] * 25
+    assert [f(v) for v in values] == list(map(expected, values))
+    assert f.tier == 'compiled'
+    assert [f(v) for v in values] == list(map(expected, values))
+
+
+def test_not_folded():
+    # isinstance of abstract classes is not decided by the type alone
+    f = adaptive(If(Len(_), IsInstance(_, Sized), -1), warmup_calls=1)
+    assert f([1, 2]) == 2
+    assert f.tier == 'specialized'
+    assert repr(f.specialized) == repr(If(Len(_), IsInstance(_, Sized), -1))
+    assert f([]) == 0
+
+
+def test_pickle():
+    f = adaptive(describe, warmup_calls=2)
+    f(1)
+    f(2)
+    copied = pickle.loads(pickle.dumps(f))
+    assert copied.tier == 'interpreted'
+    assert copied.warmup_calls == 2
+    assert copied(3) == 6
+
+
+def test_invalid():
+    with raises(ValueError):
+        adaptive(_, warmup_calls=0)
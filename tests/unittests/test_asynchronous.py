@@ -0,0 +1,70 @@
+from asyncio import sleep, run, get_running_loop
+from types import SimpleNamespace
+
+from pytest import mark
+
+from expressive import _, e, ae, Const, If, And, Coalesce
+
+
+async def lookup(key, delay=0.05):
+    await sleep(delay)
+    return key * 2
+
+
+class Client:
+    def __init__(self):
+        self.calls = []
+
+    async def get(self, key):
+        self.calls.append(key)
+        await sleep(0.01)
+        return key + 1
+
+    @property
+    def ready(self):
+        return sleep(0, result=True)
+
+
+def test_ae():
+    Lookup = Const(lookup, 'Lookup')
+    f = ae(Lookup(_.a) + Lookup(_.b))
+    assert repr(f) == 'ae(Lookup(_.a) + Lookup(_.b))'
+    assert run(f(SimpleNamespace(a=1, b=2))) == 6
+
+
+def test_ae_literals():
+    # literals holding expressions are evaluated, even if they do not depend on the parameter
+    assert run(ae([Const(1), 2])(0)) == [1, 2]
+    assert run(ae({'a': (Const(1) + 1,), 'b': [_]})(0)) == {'a': (2,), 'b': [0]}
+    constant = [1, (2,)]
+    assert run(ae(constant)(0)) is constant
+    f = ae(e(_ + 1))
+    assert repr(f) == 'ae(_ + 1)'
+    assert run(f(1)) == 2
+
+
+def test_ae_concurrent():
+    async def main():
+        f = ae([Const(lookup)(_, 0.2), Const(lookup)(_ + 1, 0.2), Const(lookup)(_ + 2, 0.2)])
+        loop = get_running_loop()
+        start = loop.time()
+        ret = await f(1)
+        return ret, loop.time() - start
+
+    ret, elapsed = run(main())
+    assert ret == [2, 4, 6]
+    assert elapsed < 0.5
+
+
+def test_ae_attributes():
+    client = Client()
+    f = ae(If(_.get(1), _.ready, 0))
+    assert run(f(client)) == 2
+
+
+@mark.parametrize('v, expected, calls', [(None, 0, []), (3, 4, [3])])
+def test_ae_short_circuit(v, expected, calls):
+    client = Client()
+    f = ae(Coalesce(And(Const(v), Const(client).get(Const(v))), 0))
+    assert run(f(None)) == expected
+    assert client.calls == calls
@@ -0,0 +1,41 @@
+import subprocess
+import sys
+
+import expressive
+import expressive.delayed
+
+# the time import expressive may take in a new interpreter, in seconds
+IMPORT_BUDGET = 0.1
+
+
+def run(code: str) -> str:
+    return subprocess.run([sys.executable, '-c', code], check=True, capture_output=True, text=True).stdout
+
+
+def test_import_time():
+    code = 'from time import perf_counter; start = perf_counter(); import expressive; print(perf_counter() - start)'
+    assert min(float(run(code)) for _ in range(3)) < IMPORT_BUDGET
+
+
+def test_lazy_imports():
+    code = 'import sys, expressive; print(*sorted(m for m in (' \
+           '"expressive.delayed", "expressive.asynchronous", "expressive.specialized", "asyncio", "dataclasses", ' \
+           '"textwrap") if m in sys.modules))'
+    assert run(code).split() == []
+    code = 'import sys; from expressive import Len; print("expressive.delayed" in sys.modules, Len)'
+    assert run(code).split() == ['True', 'Len']
+
+
+def test_lazy_names():
+    # the lazily imported names are a copy of the delayed module's
+    assert expressive._delayed_all == expressive.delayed.__all__
+    assert all(hasattr(expressive, name) for name in expressive.__all__)
+    assert run('from expressive import *; print(Len(_))').strip() == 'Len(_)'
+    assert expressive.Len is expressive.delayed.Len
+    assert {'Len', 'ae', 'e'} <= set(dir(expressive))
+
+
+def test_unpickle_delayed():
+    from pickle import dumps
+    code = f'import pickle; print(pickle.loads({dumps(expressive.Len(expressive._))!r}))'
+    assert run(code).strip() == 'Len(_)'
@@ -0,0 +1,75 @@
+from time import sleep
+from types import SimpleNamespace
+
+from expressive import _, e, Const, If, Len, Memo
+
+
+def slow(x):
+    sleep(0.01)
+    return x
+
+
+def test_profile():
+    f = e(If(Const(slow, 'Slow')(_.a) + Len(_.b), _.a > 0, [_.a, {'k': Len(_.b)}]), profile=True)
+    assert [f(SimpleNamespace(a=a, b='xy')) for a in (1, 0, 2)] == [3, [0, {'k': 2}], 4]
+
+    profile = f.profile
+    assert profile.root.expression == repr(f.spe)
+    assert profile.root.calls == 3
+    tree = [(depth, node.expression, node.calls) for (depth, node) in profile.root.walk()]
+    assert tree == [
+        (0, "If(Slow(_.a) + Len(_.b), _.a > 0, [_.a, {'k': Len(_.b)}])", 3),
+        (1, 'Slow(_.a) + Len(_.b)', 2),
+        (2, 'Slow(_.a)', 2),
+        (3, '_.a', 2),
+        (2, 'Len(_.b)', 2),
+        (3, '_.b', 2),
+        (1, '_.a > 0', 3),
+        (2, '_.a', 3),
+        (1, '_.a', 1),
+        (1, 'Len(_.b)', 1),
+        (2, '_.b', 1),
+    ]
+    slow_node = profile.root.children[0].children[0]
+    assert slow_node.own >= 0.02
+    assert slow_node.own > profile.root.total / 2
+    assert profile.root.own < slow_node.own
+
+    by_expression = profile.by_expression()
+    assert by_expression['_.a'].calls == 6
+    assert by_expression['Len(_.b)'].calls == 3
+
+    report = profile.report(min_fraction=0.5).splitlines()
+    assert len(report) == 4
+    assert report[3].endswith('    Slow(_.a)')
+
+    profile.reset()
+    assert profile.root.calls == 0
+
+
+def test_profile_literal():
+    f = e({'k': [Len(_)], 'j': _}, profile=True)
+    assert f('ab') == {'k': [2], 'j': 'ab'}
+    assert [node.expression for (_depth, node) in f.profile.root.walk()] == ["{'k': [Len(_)], 'j': _}", 'Len(_)']
+
+
+def test_profile_memo():
+    calls = []
+
+    def f(x):
+        calls.append(x)
+        return x * 10
+
+    g = e(Memo(Const(f)(_ // 2)), profile=True)
+    assert [g(i) for i in (0, 2, 3, 4)] == [0, 10, 10, 20]
+    assert calls == [0, 1, 2]
+    assert g.profile.root.calls == 4
+    # a conditional subexpression is still keyed on the parameter, not on all its operands
+    h = e(Memo(If(1 / _, _ != 0, 0)), profile=True)
+    assert h(0) == 0 and h(2) == 0.5
+
+
+def test_profile_off():
+    f = e(_ + 1)
+    assert not hasattr(f, 'profile')
+    assert e(f, profile=True).profile.root.expression == '_ + 1'
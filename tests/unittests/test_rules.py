@@ -0,0 +1,125 @@
+from itertools import product
+from types import SimpleNamespace
+
+from pytest import mark, raises
+
+from expressive import _, e, Const, And, If, In, Len, Or, pure
+from expressive.rules import ExpressionSet, RuleIndex
+
+
+def event(country, amount, tags=()):
+    return SimpleNamespace(payload=SimpleNamespace(user=SimpleNamespace(country=country), amount=amount, tags=tags))
+
+
+rules = {
+    'german': _.payload.user.country == 'DE',
+    'big': _.payload.amount > 100,
+    'big german': (_.payload.user.country == 'DE') & (_.payload.amount > 100),
+    'tagged': And(Len(_.payload.tags), _.payload.tags[0] == 'x'),
+    'size': If(_.payload.amount > 100, 'big', 'small'),
+}
+
+
+def test_evaluate():
+    rule_set = ExpressionSet(rules)
+    for v in (event('DE', 150), event('FR', 5, ['x']), event('DE', 1, ['y'])):
+        assert rule_set.evaluate(v) == {k: e(r)(v) for (k, r) in rules.items()}
+        assert rule_set.matches(v) == [k for (k, r) in rules.items() if e(r)(v)]
+
+
+def test_shared():
+    calls = []
+
+    @pure
+    def country(user):
+        calls.append(user)
+        return user.country
+
+    country_of = Const(country)(_.payload.user)
+    rule_set = ExpressionSet([country_of == 'DE', country_of != 'FR', Len(country_of) == 2])
+    assert rule_set.matches(event('DE', 1)) == [0, 1, 2]
+    assert len(calls) == 1
+    assert rule_set.evaluate(event('FR', 1)) == {0: False, 1: False, 2: True}
+    assert len(calls) == 2
+
+
+def test_finalized():
+    rule_set = ExpressionSet({'a': e(_ > 5), 'b': e(_ + 1, compile=True), 'c': _ < 5})
+    assert rule_set.matches(1) == ['b', 'c']
+    assert rule_set.evaluate(6) == {'a': True, 'b': 7, 'c': False}
+
+
+def test_modify():
+    rule_set = ExpressionSet()
+    assert rule_set.matches(event('DE', 1)) == []
+    rule_set.add('german', rules['german'])
+    rule_set.add('big', rules['big'])
+    assert rule_set.matches(event('DE', 1)) == ['german']
+    rule_set.remove('german')
+    assert rule_set.matches(event('DE', 1)) == []
+    assert list(rule_set) == ['big'] and len(rule_set) == 1 and 'big' in rule_set
+    assert rule_set['big'] is rules['big']
+    with raises(KeyError):
+        rule_set.remove('german')
+
+
+def test_deep():
+    deep = _
+    for _i in range(10000):
+        deep = deep + 1
+    rule_set = ExpressionSet([deep > 10000, deep - 10000])
+    assert rule_set.evaluate(1) == {0: True, 1: 1}
+    assert rule_set.matches(0) == []
+
+
+indexed_rules = {
+    'click': _['type'] == 'click',
+    'german click': (_['type'] == 'click') & ('DE' == _['country']) & (_['amount'] > 10),
+    'european': And(In(_['country'], ('DE', 'FR')), _['amount'] < 100),
+    'view or click': In(_['type'], {'view', 'click'}) & (Len(_['type']) == 5),
+    'one': _['amount'] == 1,
+    'true': _['amount'] == True,  # noqa: E712
+    'any': Or(_['amount'] > 50, _['country'] == 'IL'),
+    'nested': _['meta'] == ('a', 1),
+    'dynamic': _['type'] == _['country'],
+}
+
+
+@mark.parametrize('type_, country, amount, meta', list(product(
+    ['click', 'view', 'IL'], ['DE', 'IL', 'US'], [1, 20, 70, True, 1.0], [('a', 1), ['a', 1], None])))
+def test_rule_index(type_, country, amount, meta):
+    v = {'type': type_, 'country': country, 'amount': amount, 'meta': meta}
+    assert RuleIndex(indexed_rules).matches(v) == ExpressionSet(indexed_rules).matches(v)
+
+
+def test_rule_index_paths():
+    index = RuleIndex(indexed_rules)
+    index.matches({'type': 'view', 'country': 'US', 'amount': 1, 'meta': None})
+    paths = sorted(repr(i.path.spe) for i in index._indices)
+    assert paths == ["_['amount']", "_['country']", "_['meta']", "_['type']"]
+    assert sorted(index._unindexed) == ['any', 'dynamic']
+
+
+def test_rule_index_conditional():
+    # only the first operand of And is always evaluated, the rest must not be evaluated for values that fail it
+    index = RuleIndex([And(_.kind == 'user', _.user.name == 'ann'), _.kind == 'bot'])
+    assert index.matches(SimpleNamespace(kind='bot')) == [1]
+    assert index.matches(SimpleNamespace(kind='user', user=SimpleNamespace(name='ann'))) == [0]
+
+
+def test_rule_index_finalized():
+    index = RuleIndex({'a': e(_.real == 5), 'b': e((_.real == 1) & (_.imag == 0), compile=True), 'c': e(_ > 5)})
+    assert index.matches(1) == ['b']
+    assert index.matches(5) == ['a']
+    assert len(index._indices) == 1
+
+
+def test_rule_index_modify():
+    index = RuleIndex()
+    assert index.matches({}) == []
+    index.add('click', indexed_rules['click'])
+    index.add('nan', _['amount'] == float('nan'))
+    assert index.matches({'type': 'click', 'amount': float('nan')}) == ['click']
+    index.remove('click')
+    assert index.matches({'type': 'click', 'amount': 1}) == []
+    assert list(index) == ['nan'] and 'nan' in index and len(index) == 1
@@ -0,0 +1,94 @@
+import pickle
+from copy import deepcopy
+from math import floor
+from operator import itemgetter
+
+from pytest import mark, raises
+
+from expressive import _, e, Const, If, And, Coalesce, In, Len, Memo, Sorted, Floor
+from expressive.serialization import dumps, loads, dumpb, loadb, encode, decode, register
+from expressive.single import StructuralKey
+
+expressions = [
+    _,
+    _.a + 1,
+    -_[1:2],
+    _['x'] * 2 <= 10,
+    Len(_),
+    In(_, (1, 2)),
+    Floor(_ / 3),
+    Sorted(_, reverse=True),
+    Const(floor)(_),
+    If(_.a, _ > 1, [_, {'k': _, 'c': 1.5}]),
+    And(_, _.b),
+    Coalesce(_.get('a'), 0),
+    (_, {1, 'a'}, frozenset((2,)), b'\x00\xff', 1j),
+    Const(3),
+]
+
+
+@mark.parametrize('expr', expressions)
+def test_pickle(expr):
+    for copied in (pickle.loads(pickle.dumps(expr)), deepcopy(expr)):
+        assert StructuralKey(copied) == StructuralKey(expr)
+        assert repr(copied) == repr(expr)
+
+
+@mark.parametrize('expr', expressions)
+def test_encode(expr):
+    for copied in (decode(encode(expr)), loads(dumps(expr)), loadb(dumpb(expr))):
+        assert StructuralKey(copied) == StructuralKey(expr)
+        assert repr(copied) == repr(expr)
+
+
+@mark.parametrize('kwargs', [{}, {'compile': True}, {'iterative': True}])
+def test_serialize_finalized(kwargs):
+    f = e(_['a'] * 2 + Len(_['b']), **kwargs)
+    v = {'a': 3, 'b': [1, 2]}
+    for copied in (pickle.loads(pickle.dumps(f)), loads(dumps(f))):
+        assert repr(copied) == repr(f)
+        assert copied(v) == 8
+
+
+def test_serialize_unshared():
+    f = e([_ + 1, _ + 1], compile=True, share=False)
+    for copied in (pickle.loads(pickle.dumps(f)), loads(dumps(f))):
+        assert copied.source == f.source
+        assert copied(1) == [2, 2]
+
+
+def test_named():
+    assert pickle.loads(pickle.dumps(Len)) is Len
+    assert dumps(Len(_)) == '["n","Call",["c","Len"],["t",["_"]],["d"]]'
+    assert dumps(_ + 1) == '["n","BinOp","+",["x","operator.add"],["_"],1]'
+
+
+def test_memo():
+    memo = Memo(Len(_), maxsize=10, ttl=5)
+    e(memo)('abc')
+    for copied in (pickle.loads(pickle.dumps(memo)), loads(dumps(memo))):
+        assert repr(copied) == 'Memo(Len(_), maxsize=10, ttl=5)'
+        assert copied.cache_info().currsize == 0
+
+
+def test_register():
+    def double(x):
+        return x * 2
+
+    with raises(TypeError):
+        dumps(Const(double)(_))
+    register(double, 'test.double')
+    assert e(loads(dumps(Const(double)(_))))(2) == 4
+    with raises(ValueError):
+        register(itemgetter(0), 'test.double')
+
+
+def test_decode_unknown():
+    with raises(ValueError):
+        decode(['n', 'eval', 'print(1)'])
+    with raises(ValueError):
+        decode(['?'])
+    with raises(ValueError):
+        decode(['x', 'os.system'])
+    with raises(ValueError):
+        decode(['c', 'NoSuchName'])
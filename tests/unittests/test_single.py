@@ -1,12 +1,16 @@
 from collections import ChainMap, Counter
+from itertools import count
+from random import random
 from dataclasses import dataclass
 from types import SimpleNamespace
+from operator import attrgetter, itemgetter, methodcaller
 from typing import NamedTuple
 
 from pytest import raises, mark
 
-from expressive import _, e, In, Str, DivMod, Const, Abs, If
-from expressive.single import _eq_
+from expressive import _, e, In, Str, DivMod, Const, Abs, If, And, Or, Coalesce, Len, List, Memo, Print, Range, optimize, \
+    impure, pure, StructuralKey, InternTable
+from expressive.single import _eq_, GetAttr
 
 namespace = SimpleNamespace  # bpo-42088
 
@@ -63,6 +67,8 @@ class Point3F:
     z: int
 
 
+@mark.parametrize('e_kwargs', [{}, {'compile': True}, {'optimize': True}, {'compile': True, 'optimize': True},
+                                {'iterative': True}])
 @mark.parametrize('v', [1, 3, 8, True, 'hi', '', 'hello', [1, 2, 3, 'gy'],
                         1.5, 1.0, {'a': 1, 'b': 2}, {}, 0, -1.0, None])
 @mark.parametrize('ex, lam', [
@@ -89,19 +95,82 @@ class Point3F:
     (TypeError(_, 12), lambda x: TypeError(x, 12)),
     (SimpleNamespace(a=1, b=_ + _), lambda x: SimpleNamespace(a=1, b=x + x)),
     (If('yes', _, 'no'), lambda x: 'yes' if x else 'no'),
+    (And(_, _ + 1), lambda x: x and x + 1),
+    (Or(_, _[0], 'empty'), lambda x: x or x[0] or 'empty'),
+    (Coalesce(_.get('a'), _), lambda x: x.get('a') if x.get('a') is not None else x),
     (ChainMap({'x': 1}, _), lambda x: ChainMap({'x': 1}, x)),
     (Counter(a=_), lambda x: Counter(a=x)),
     (Point(_, _), lambda x: Point(x, x)),
     (Point3(_, _, _), lambda x: Point3(x, x, x)),
     (Point3F(_, _, _), lambda x: Point3F(x, x, x)),
 ])
-def test_op(v, ex, lam):
+def test_op(v, ex, lam, e_kwargs):
     evaled = eval(repr(ex))
     assert _eq_(ex, evaled)
-    ex = e(ex)
+    assert hash(StructuralKey(ex)) == hash(StructuralKey(evaled))
+    ex = e(ex, **e_kwargs)
     equivalent(v, lam, ex)
 
 
+def test_compile():
+    f = e(_.real * _.imag > 100, compile=True)
+    assert repr(f) == 'e(_.real * _.imag > 100)'
+    assert 'v.real * v.imag' in f.source
+    assert f(20 + 10j)
+    assert not f(2 + 1j)
+    assert e(f) is f
+    assert e(f, compile=True) is f
+    assert e(e(_ + 1), compile=True).source
+
+
+def test_compile_unusual_names():
+    f = e(Const(namespace).__call__(**{'a b': _}), compile=True)
+    assert getattr(f(1), 'a b') == 1
+    assert e(GetAttr(_, 'a b'), compile=True)(f(1)) == 1
+
+
+def test_iterative_deep():
+    ex = _
+    for i in range(5000):
+        ex = ex + i
+    for kwargs in ({}, {'iterative': True}, {'compile': True}, {'optimize': True}):
+        assert e(ex, **kwargs)(1) == 1 + sum(range(5000))
+
+
+def test_iterative_deep_conditional():
+    ex = _
+    for i in range(5000):
+        ex = If(1, _ > i, 0) + [ex, 1][0]
+    f = e(ex, iterative=True)
+    assert f(10) == 20
+    assert f(-1) == -1
+    assert f(6000) == 11000
+
+
+@mark.parametrize('ex, expected', [
+    ([(_, 1)], [(2, 1)]),
+    ({'a': (_, 2), 'b': [_ + 1]}, {'a': (2, 2), 'b': [3]}),
+    (SimpleNamespace(a=1, b=(_ + _, [_])), SimpleNamespace(a=1, b=(4, [2]))),
+    (Counter(a=_, b=[1, _]), Counter(a=2, b=[1, 2])),
+    (Point(_, (_, Point3(_, 0, [_]))), Point(2, (2, Point3(2, 0, [2])))),
+    (Const(namespace)(a=_, b=[_, {'c': _}]), SimpleNamespace(a=2, b=[2, {'c': 2}])),
+    (Const(dict)([('x', _)], y=_ * 2), {'x': 2, 'y': 4}),
+    (Const(sorted)([_, 3, 1], key=Const(lambda x: -x), reverse=True), [1, 2, 3]),
+])
+def test_iterative_literals(ex, expected):
+    assert are_equal(e(ex, iterative=True)(2), expected)
+    assert are_equal(e(ex)(2), expected)
+
+
+def test_compile_too_deep():
+    ex = _
+    for i in range(250):
+        ex = ex + 1
+    f = e(ex, compile=True)
+    assert not hasattr(f, 'source')
+    assert f(0) == 250
+
+
 def as_method():
     @dataclass
     class A:
@@ -111,3 +180,242 @@ def as_method():
 
     a = A(12)
     assert a.sq() == 144
+
+
+@mark.parametrize('ex, expected', [
+    (_ * (Const(3) + 4), _ * Const(7)),
+    (Const(abs)(-2) * _, Const(2) * _),
+    (Const('abc').upper() + _, Const('ABC') + _),
+    ([Const(1) + 1, _], [Const(2), _]),
+    (If(Len('ab'), _, 0), If(Const(2), _, 0)),
+    (If('yes', Const(1) > 0, 'no'), Const('yes')),
+    (Print('x') + _, Print('x') + _),
+    (Len(List(Range(3))), Len(List(Const(range(3))))),
+    (Const(1) / 0 + _, Const(1) / 0 + _),
+])
+def test_optimize(ex, expected):
+    assert _eq_(optimize(ex), expected)
+
+
+def test_optimize_mutable():
+    assert _eq_(optimize(Const([1]) + [2]), Const([1]) + [2])
+    assert _eq_(optimize(Len(Const([1]) + [2]) * _), Const(2) * _)
+    g = e(Const([1]) + [2], optimize=True)
+    g(0).append(9)
+    assert g(0) == [1, 2]
+
+
+def test_optimize_impure():
+    calls = []
+
+    @impure
+    def f():
+        calls.append(None)
+        return len(calls)
+
+    g = e(Const(f)() + _, optimize=True)
+    assert calls == []
+    assert g(0) == 1
+    assert g(0) == 2
+
+
+class Counting:
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+        self.lookups = Counter()
+
+    def __getattribute__(self, item):
+        if item not in ('__dict__', 'lookups'):
+            self.lookups[item] += 1
+        return super().__getattribute__(item)
+
+
+def test_common_subexpressions():
+    f = e((_.order.total - _.order.discount) / (_.order.total + 1), compile=True)
+    order = Counting(total=9, discount=4)
+    record = Counting(order=order)
+    assert f(record) == 0.5
+    assert record.lookups == {'order': 1}
+    assert order.lookups == {'total': 1, 'discount': 1}
+    f = e((_.order.total - _.order.discount) / (_.order.total + 1), compile=True, share=False)
+    order = Counting(total=9, discount=4)
+    assert f(Counting(order=order)) == 0.5
+    assert order.lookups == {'total': 2, 'discount': 1}
+
+
+def test_common_subexpressions_conditional():
+    f = e(If(_.a + 1, _.b, _.a + 1), compile=True, optimize=True)
+    rec = Counting(a=1, b=True)
+    assert f(rec) == 2
+    assert rec.lookups == {'a': 1, 'b': 1}
+    with raises(AttributeError):
+        f(Counting(b=False))
+
+
+def test_common_subexpressions_impure():
+    f = e(_.pop() + _.pop(), compile=True, optimize=True)
+    assert f([1, 2]) == 3
+    f = e((Print(_), Print(_)), compile=True, optimize=True)
+    assert f.source.count('(v)') == 2
+
+
+def test_common_subexpressions_unknown_calls():
+    # calls to callables that are not known to be pure are evaluated as many times as they appear
+    ticks = count()
+    tick = Const(lambda v: next(ticks))
+    assert e([tick(_), tick(_) + 10], compile=True)(0) == [0, 11]
+    values = e((Const(random)(), Const(random)()), compile=True)(0)
+    assert values[0] != values[1]
+
+    @pure
+    def double(x):
+        return x * 2
+
+    f = e([Const(double)(_.a), Const(double)(_.a) + 'z', Len(_.a), Len(_.a) * 2], compile=True)
+    assert f(namespace(a='xy')) == ['xyxy', 'xyxyz', 2, 4]
+    assert f.source.count('_c0(') == 1 and f.source.count('_c2(') == 1
+
+
+def test_structural_key():
+    rules = {StructuralKey(_.a + 1): 'a', StructuralKey([_.b, {'x': _}]): 'b'}
+    assert rules[StructuralKey(_.a + 1)] == 'a'
+    assert rules[StructuralKey([_.b, {'x': _}])] == 'b'
+    assert StructuralKey(_.a + 1) not in {StructuralKey(_.a + 2), StructuralKey(_.b + 1), StructuralKey(1 + _.a)}
+    assert StructuralKey(_.f(1, x=2, y=3)) == StructuralKey(_.f(1, y=3, x=2))
+    # equal constants of different types are not interchangeable
+    assert StructuralKey(Const(1)) != StructuralKey(Const(1.0))
+    assert StructuralKey(_ + [1, True]) != StructuralKey(_ + [1, 1])
+    assert e([_ + 1, _ + 1.0], compile=True)(1) == [2, 2.0]
+    assert type(e([_ + 1, _ + 1.0], compile=True)(1)[1]) is float
+
+
+def test_signed_zeros():
+    # 0.0 and -0.0 are equal, but expressions with them are not interchangeable
+    assert not _eq_(0.0, -0.0) and not _eq_(complex(1, 0.0), complex(1, -0.0)) and _eq_(-0.0, -0.0)
+    assert StructuralKey(_ * 0.0) != StructuralKey(_ * -0.0)
+    assert str(e(_ * 0.0, compile=True)(1.0)) == '0.0'
+    assert str(e(_ * -0.0, compile=True)(1.0)) == '-0.0'
+    assert [str(x) for x in e([_ * 0.0, _ * -0.0], compile=True)(1.0)] == ['0.0', '-0.0']
+
+
+def test_intern():
+    table = InternTable()
+    a = table.intern((_.order.total - 1) / _.order.total)
+    b = table.intern(_.order.total * 2)
+    assert a is table.intern((_.order.total - 1) / _.order.total)
+    assert (_.order.total * 2) in table
+    assert len(table) == 6
+    table.clear()
+    assert len(table) == 0
+    assert table.intern(b) is b
+    assert table.intern([_ + 1, 2])[0] is table.intern(_ + 1)
+
+
+def test_literal_template():
+    inner = [1, 2]
+    f = e((_.real, inner, {'k': [inner, -_.imag]}, Point3(_, 0, inner)))
+    ret = f(1 + 2j)
+    assert ret == (1, [1, 2], {'k': [[1, 2], -2]}, Point3(1 + 2j, 0, [1, 2]))
+    assert ret[1] is inner
+    assert ret[2]['k'][0] is inner
+    assert ret[3].z is inner
+    assert e(inner)(0) is inner
+
+
+@mark.parametrize('e_kwargs', [{}, {'compile': True}, {'iterative': True}, {'optimize': True}])
+def test_short_circuit(e_kwargs):
+    f = e(And(_.x != None, _.x.cost > 10), **e_kwargs)  # noqa: E711
+    assert f(namespace(x=None)) is False
+    assert f(namespace(x=namespace(cost=11))) is True
+    g = e(Or(_.cached, Coalesce(_.fallback, _.default, 0) + 1), **e_kwargs)
+    assert g(namespace(cached=3)) == 3
+    assert g(namespace(cached=0, fallback=None, default=None)) == 1
+    assert g(namespace(cached=0, fallback=None, default=5)) == 6
+    assert g(namespace(cached=None, fallback=1)) == 2
+    with raises(TypeError):
+        And(_)
+
+
+@mark.parametrize('e_kwargs', [{}, {'compile': True}, {'iterative': True}, {'optimize': True}])
+def test_memo(e_kwargs):
+    calls = []
+
+    def lookup(key):
+        calls.append(key)
+        return key * 2
+
+    memo = Memo(Const(lookup)(_['ip']), maxsize=2)
+    f = e([memo, _['n']], **e_kwargs)
+    assert [f({'ip': ip, 'n': n})[0] for (n, ip) in enumerate([1, 2, 1, 3, 2])] == [2, 4, 2, 6, 4]
+    assert calls == [1, 2, 3, 2]
+    assert memo.cache_info() == (1, 4, 2, 0, 2, 2)
+    assert repr(memo) == "Memo(Const(%r)(_['ip']), maxsize=2)" % lookup
+    memo.cache_clear()
+    assert memo.cache_info() == (0, 0, 0, 0, 2, 0)
+
+
+def test_memo_ttl():
+    now = [0]
+    memo = Memo(Const(list)(_), ttl=10, timer=lambda: now[0])
+    f = e(memo)
+    first = f('ab')
+    assert f('ab') is first
+    now[0] = 11
+    assert f('ab') is not first
+    assert memo.cache_info().expirations == 1
+    # conditional subexpressions are keyed on the parameter
+    conditional = Memo(If(_ * 2, _ > 0, 0))
+    assert e(conditional)(3) == 6
+    assert e(conditional)(3) == 6
+    assert conditional.cache_info().hits == 1
+
+
+@mark.parametrize('spe, v, expected', [
+    (_.real, 1 + 2j, 1),
+    (_.x.real, namespace(x=3), 3),
+    (_['a'], {'a': 1}, 1),
+    (_[1:3], 'abcd', 'bc'),
+    ((_['a'], _['b']), {'a': 1, 'b': 2}, (1, 2)),
+    ((_.real, _.imag), 1 + 2j, (1, 2)),
+    (_.strip(), ' x ', 'x'),
+    (_.split(sep=','), 'a,b', ['a', 'b']),
+])
+@mark.parametrize('e_kwargs', [{}, {'compile': True}, {'optimize': True}])
+def test_lowered(spe, v, expected, e_kwargs):
+    f = e(spe, **e_kwargs)
+    assert type(type(f).__call__) in (attrgetter, itemgetter, methodcaller)
+    assert repr(f) == f'e({spe!r})'
+    assert f(v) == expected
+
+
+@mark.parametrize('spe', [_[_], _.x(_), (_.a, _['b']), (_.a,), _.x.strip(), GetAttr(_, 'a b'), _.get([_])])
+def test_not_lowered(spe):
+    f = e(spe)
+    assert type(type(f).__call__) not in (attrgetter, itemgetter, methodcaller)
+
+
+def test_e_cache():
+    e.cache_clear()
+    f = e(_.a + 1, compile=True)
+    assert e(_.a + 1, compile=True) is f
+    assert e(_.a + 1, optimize=True) is not f
+    assert e(_.a + 1) is not e(_.a + 1)
+    assert e(_ + 1, compile=True) is not e(_ + 1.0, compile=True)
+    # a finalized expression with a mutable constant is not shared
+    assert e([_, [1]], compile=True) is not e([_, [1]], compile=True)
+    assert e.cache_info() == (1, 4, 0, 1024, 4)
+
+    e.cache_resize(2)
+    try:
+        assert e.cache_info().evictions == 2
+        assert e(_.a + 1, compile=True) is not f
+        assert e.cache_info().currsize == 2
+    finally:
+        e.cache_resize(1024)
+    e.cache_clear()
+    assert e.cache_info() == (0, 0, 0, 1024, 0)
+
+    deep = _
+    for _i in range(10000):
+        deep = deep + 1
+    assert e(deep, iterative=True)(0) == 10000
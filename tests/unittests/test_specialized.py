@@ -1,6 +1,11 @@
-from pytest import mark
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from operator import itemgetter
+from tempfile import TemporaryFile
+from types import SimpleNamespace
 
-from expressive import _, Int
+from pytest import importorskip, mark, raises
+
+from expressive import _, e, Int, Len
 from expressive.specialized import *
 
 
@@ -37,6 +42,57 @@ def test_cached_property():
     assert a.calls == ['a']
 
 
+sales = [{'region': r, 'amount': a, 'latency': l} for (r, a, l) in
+         [('eu', 1, 5), ('us', 2, 7), ('eu', 3, 1), ('us', None, 2), ('asia', 4, 4), ('eu', 5, 9)]]
+
+
+def test_aggregate():
+    assert aggregate_e(sales, _['region'], sum=_['latency'], count=_['amount'], mean=_['latency'] * 2,
+                       min=_['latency'], max=_['latency'], first=_['amount'], last=_['amount']) == {
+        'eu': {'sum': 15, 'count': 3, 'mean': 10.0, 'min': 1, 'max': 9, 'first': 1, 'last': 5},
+        'us': {'sum': 9, 'count': 1, 'mean': 9.0, 'min': 2, 'max': 7, 'first': 2, 'last': None},
+        'asia': {'sum': 4, 'count': 1, 'mean': 8.0, 'min': 4, 'max': 4, 'first': 4, 'last': 4},
+    }
+    assert list(aggregate_e(sales, _['latency'] % 2)) == [1, 0]
+    assert aggregate_e([], _) == {}
+    # values are not mutated when aggregated
+    lists = [[1], [2]]
+    assert aggregate_e(lists, 0, sum=_) == {0: {'sum': [1, 2]}}
+    assert lists == [[1], [2]]
+    # finalized expressions are aggregated like the expressions they finalize
+    assert aggregate_e([1, 2, 3], key=e(_ % 2), sum=e(_), max=e(_ * 2, compile=True)) == {
+        1: {'sum': 4, 'max': 6}, 0: {'sum': 2, 'max': 4}}
+    with raises(TypeError):
+        aggregate_e(sales, _['region'], median=_['amount'])
+
+
+@mark.parametrize('executor_type', [ThreadPoolExecutor, ProcessPoolExecutor])
+def test_aggregate_executor(executor_type):
+    kwargs = {'sum': _ * 2, 'count': _, 'min': _ % 7, 'max': _ % 11, 'first': _, 'last': _, 'mean': _}
+    expected = aggregate_e(range(1000), _ % 10, **kwargs)
+    with executor_type(2) as executor:
+        assert aggregate_e(range(1000), _ % 10, executor=executor, chunksize=64, **kwargs) == expected
+    assert expected[3] == {'sum': 99600, 'count': 100, 'min': 0, 'max': 10, 'first': 3, 'last': 993, 'mean': 498.0}
+
+
+@mark.parametrize('reverse', [False, True])
+@mark.parametrize('keys', [[3, 1, 2, 1, 3], [0.5, -1.0, 0.5], ['b', 'a', 'b', 'c'], [10 ** 30, 1, 10 ** 30], []])
+def test_argsort(keys, reverse):
+    items = [(k, i) for (i, k) in enumerate(keys)]
+    expected = sorted(range(len(items)), key=lambda i: items[i][0], reverse=reverse)
+    assert argsort_e(items, key=_[0], reverse=reverse) == expected
+    assert sorted_e(items, key=_[0], reverse=reverse, batch=True) == sorted(items, key=itemgetter(0), reverse=reverse)
+
+
+@mark.parametrize('reverse', [False, True])
+def test_argsort_numpy(reverse):
+    np = importorskip('numpy')
+    keys = [i * 7919 % 101 for i in range(1000)]
+    assert argsort_e(keys, key=_, reverse=reverse) == sorted(range(1000), key=keys.__getitem__, reverse=reverse)
+    assert type(argsort_e(keys, key=_)[0]) is int
+    assert argsort_e([np.int64(2), 1], key=_) == [1, 0]
+
+
 def test_classmethod():
     class A:
         _x = 1
@@ -55,6 +111,12 @@ def test_filter():
     assert list(filter_e(_ >= 5, [6, 5, 2, 4, 6, 1, 3])) == [6, 5, 6]
 
 
+@mark.parametrize('executor_type', [ThreadPoolExecutor, ProcessPoolExecutor])
+def test_filter_executor(executor_type):
+    with executor_type(2) as executor:
+        assert list(filter_e(_ % 3 == 0, range(100), executor=executor, chunksize=7)) == list(range(0, 100, 3))
+
+
 def test_filterfalse():
     assert list(filterfalse_e(_ >= 5, [6, 5, 2, 4, 6, 1, 3])) == [2, 4, 1, 3]
 
@@ -67,6 +129,75 @@ def test_groupby():
     ]
 
 
+users = [SimpleNamespace(user=SimpleNamespace(id=i), name=n) for (i, n) in [(1, 'ann'), (2, 'bob'), (3, 'cy'), (2, 'bo')]]
+events = [{'uid': u, 'event': n} for (n, u) in enumerate([2, 4, 1, 2, 2, 5])]
+
+
+def expected_join(left, right, how):
+    ret = []
+    for l in left:
+        matches = [r for r in right if l.user.id == r['uid']]
+        if how == 'inner' or (how == 'left' and matches):
+            ret.extend((l, r) for r in matches)
+        elif how == 'left':
+            ret.append((l, None))
+        elif (how == 'semi') == bool(matches):
+            ret.append(l)
+    return ret
+
+
+def join_ids(pairs):
+    return sorted(repr(p) for p in pairs)
+
+
+@mark.parametrize('how', ['inner', 'left', 'semi', 'anti'])
+@mark.parametrize('sized', [False, True])
+@mark.parametrize('more_left', [False, True])
+def test_join(how, sized, more_left):
+    left = users * 3 if more_left else users
+    expected = expected_join(left, events, how)
+    left_items = left if sized else iter(left)
+    right_items = events if sized else iter(events)
+    joined = list(join_e(left_items, right_items, left_key=_.user.id, right_key=_['uid'], how=how))
+    if not (sized and len(left) < len(events)):
+        # the left side is streamed, keeping its order
+        assert joined == expected
+    assert join_ids(joined) == join_ids(expected)
+
+
+@mark.parametrize('how', ['inner', 'left', 'semi', 'anti'])
+@mark.parametrize('more_left', [False, True])
+def test_join_spill(how, more_left):
+    left = users * 3 if more_left else users
+    expected = expected_join(left, events, how)
+    joined = join_e(left, events, left_key=_.user.id, right_key=_['uid'], how=how, spill_threshold=2, partitions=3)
+    assert join_ids(joined) == join_ids(expected)
+
+
+@mark.parametrize('bad_left', [False, True])
+def test_join_spill_error(monkeypatch, bad_left):
+    opened = []
+
+    def temporary_file():
+        opened.append(TemporaryFile())
+        return opened[-1]
+
+    monkeypatch.setattr('expressive.specialized.TemporaryFile', temporary_file)
+    left = users * 3 + ([None] if bad_left else [])
+    right = events + ([] if bad_left else [{}])
+    with raises(AttributeError if bad_left else KeyError):
+        list(join_e(iter(left), iter(right), left_key=_.user.id, right_key=_['uid'], spill_threshold=2, partitions=3))
+    # the partitions that were written are removed
+    assert opened and all(f.closed for f in opened)
+
+
+def test_join_invalid():
+    with raises(ValueError):
+        join_e(users, events, left_key=_.user.id, right_key=_['uid'], how='outer')
+    with raises(ValueError):
+        join_e(users, events, left_key=_.user.id, right_key=_['uid'], partitions=0)
+
+
 def list_sort():
     a = ['12', '65', '2']
     list_sort_e(a, key=Int(_))
@@ -94,6 +225,31 @@ def test_map():
     assert list(map_e(_ * _, range(5))) == [0, 1, 4, 9, 16]
 
 
+@mark.parametrize('executor_type', [ThreadPoolExecutor, ProcessPoolExecutor])
+def test_map_executor(executor_type):
+    with executor_type(2) as executor:
+        assert list(map_e(_ * _, range(1000), executor=executor, chunksize=16)) == [i * i for i in range(1000)]
+        assert list(map_e(_ * _, [], executor=executor)) == []
+
+
+def test_map_executor_backpressure():
+    consumed = []
+
+    def source():
+        for i in range(100):
+            consumed.append(i)
+            yield i
+
+    with ThreadPoolExecutor(2) as executor:
+        results = map_e(_ + 1, source(), executor=executor, chunksize=10, max_pending=2)
+        assert next(results) == 1
+        # the first chunk is consumed, and at most 2 more are in flight
+        assert len(consumed) <= 30
+        assert list(results) == list(range(2, 101))
+        with raises(ValueError):
+            map_e(_ + 1, source(), executor=executor, chunksize=0)
+
+
 def test_max():
     a = [9, 3, 18, 101]
     assert max_e(a, key=_ % 10) == 9
@@ -106,10 +262,30 @@ def test_min():
     assert min_e(*a, key=_ % 10) == 101
 
 
+def test_nlargest():
+    a = ['bb', 'a', 'dddd', 'ccc', 'ee']
+    assert nlargest_e(2, a, key=Len(_)) == ['dddd', 'ccc']
+    assert nsmallest_e(3, a, key=Len(_)) == ['a', 'bb', 'ee']
+    assert nsmallest_e(0, a, key=Len(_)) == []
+
+
 def test_partial():
     assert partial_e(_ + 9, 10)() == 19
 
 
+@mark.parametrize('n', [0, 2, 5, 10])
+@mark.parametrize('reverse', [False, True])
+def test_partial_sort(n, reverse):
+    a = [5, 3, 8, 3, 1]
+    expected = sorted(a, key=lambda x: x % 7, reverse=reverse)[:n]
+    assert partial_sort_e(a, n, key=_ % 7, reverse=reverse) is None
+    assert a[:n] == expected
+    rest = [5, 3, 8, 3, 1]
+    for x in expected:
+        rest.remove(x)
+    assert a[n:] == rest
+
+
 def test_property():
     class A:
         def __init__(self, x):
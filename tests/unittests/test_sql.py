@@ -0,0 +1,110 @@
+import sqlite3
+
+from pytest import fixture, mark, raises
+
+from expressive import _, e, Const, If, And, Or, Coalesce, In, Len, Not, Abs
+from expressive.sql import to_sql, where, select, Record
+
+rows = [
+    {'id': 1, 'name': 'ann', 'age': 17, 'score': 3.5, 'team': 'red'},
+    {'id': 2, 'name': 'bob', 'age': 18, 'score': -1.0, 'team': None},
+    {'id': 3, 'name': 'carla', 'age': 40, 'score': 7.25, 'team': 'blue'},
+    {'id': 4, 'name': 'dan', 'age': 65, 'score': 0.0, 'team': 'red'},
+    {'id': 5, 'name': 'eve', 'age': 30, 'score': None, 'team': 'green'},
+]
+
+
+@fixture
+def connection():
+    connection = sqlite3.connect(':memory:')
+    connection.execute('CREATE TABLE people (id INTEGER, name TEXT, age INTEGER, score REAL, team TEXT)')
+    connection.executemany('INSERT INTO people VALUES (:id, :name, :age, :score, :team)', rows)
+    yield connection
+    connection.close()
+
+
+def ids(records):
+    return sorted(r['id'] for r in records)
+
+
+@mark.parametrize('predicate', [
+    _.age >= 18,
+    _['age'] < 30,
+    _.team == None,
+    _.team != 'red',
+    (_.age > 20) & (_.age < 60),
+    (_.age < 18) | (_.team == 'blue'),
+    ~(_.age > 20) == -1,
+    Not(_.age > 20),
+    In(_.team, ('red', 'green')),
+    In(_.id, [2, 4]),
+    Len(_.name) == 3,
+    Abs(_.age - 40) <= 10,
+    _.age / 4 == 4.5,
+    Abs(_.age) * 2 + 1 > 60,
+    -_.age < -50,
+    _.name + '!' == 'bob!',
+    Coalesce(_.team, 'none') == 'none',
+    If(_.age, _.age > 30, 0) == 0,
+    And(_.age > 17, Or(_.team == 'red', _.team == 'blue')),
+    _.id & 1 == 1,
+])
+def test_to_sql(connection, predicate):
+    condition, params = to_sql(predicate)
+    cursor = connection.execute('SELECT * FROM people WHERE ' + condition, params)
+    assert sorted(row[0] for row in cursor) == ids(filter(e(predicate), map(Record, rows)))
+
+
+@mark.parametrize('predicate', [
+    _.age,
+    _.age // 2 == 9,
+    _.name.upper() == 'ANN',
+    _.a.b == 1,
+    In(_.team, ('red', None)),
+    Const(str.isupper)(_.name),
+    _.age ** 2 > 1,
+    # the operands may be strings, that python concatenates or repeats
+    _.name + _.team == 'annred',
+    _.age * 2 > 60,
+    # SQLite would convert the values of one of the columns to the type of the other
+    _.name == _.team,
+])
+def test_to_sql_untranslatable(predicate):
+    with raises(ValueError):
+        to_sql(predicate)
+
+
+def test_to_sql_types(connection):
+    # SQLite converts a column's values by its type affinity, python never finds values of different types equal
+    connection.execute("INSERT INTO people VALUES (6, '17', 17, 1.0, 'red')")
+    records = list(select(connection, 'people', Const(True)))
+    for predicate in (_.age == 17, _.age == '17', _.name == 17, _.age != '17', In(_.age, ['17', '18']),
+                      In(_.name, [17]), _.name + '!' == '17!'):
+        condition, params = to_sql(predicate)
+        cursor = connection.execute('SELECT id FROM people WHERE ' + condition, params)
+        assert sorted(row[0] for row in cursor) == ids(filter(e(predicate), records))
+
+
+def test_where(connection):
+    predicate = (_.age >= 18) & (_.name.startswith('c') == False) & (_.team != None)  # noqa: E712
+    condition, params, remaining = where(predicate)
+    assert condition == '("age" >= ?) AND ("team" IS NOT ?)'
+    assert params == [18, None]
+    assert repr(remaining) == "_.name.startswith('c') == False"
+    assert ids(select(connection, 'people', predicate)) == [4, 5]
+
+    condition, params, remaining = where(And(_.age > 20, _.name.isalpha(), Len(_.name) > 3))
+    assert condition == '("age" > ?) AND (length("name") > ?)'
+    assert params == [20, 3]
+    assert repr(remaining) == '_.name.isalpha()'
+
+    assert where(_.age > 1) == ('("age" > ?)', [1], None)
+    assert where(_.name.isalpha())[:2] == (None, [])
+
+
+def test_select(connection):
+    assert ids(select(connection, 'people', _.age >= 18)) == [2, 3, 4, 5]
+    assert ids(select(connection, 'people', _.name.endswith('n'))) == [1, 4]
+    records = list(select(connection, 'people', And(_.age > 60, _.name.islower()), columns=['id', 'name']))
+    assert records == [{'id': 4, 'name': 'dan'}]
+    assert records[0].name == 'dan'
@@ -0,0 +1,56 @@
+from itertools import count
+
+from pytest import mark, raises
+
+from expressive import _, e, Len, If, Memo, Str
+from expressive.stream import Stream, _generator
+
+
+def test_fused():
+    stream = Stream(range(10)).filter(_ > 2).map(_ * _ + _ * _).takewhile(_ < 120).map((_, Len(Str(_))))
+    assert stream.to_list() == [(18, 2), (32, 2), (50, 2), (72, 2), (98, 2)]
+    source, = stream._sources()
+    assert source.count('for ') == 1
+    # structurally equal pipelines share the fused generator, unless they hold mutable constants
+    assert _generator([('map', _ + 1), ('filter', _ > 2)]) is _generator([('map', _ + 1), ('filter', _ > 2)])
+    assert _generator([('map', _ + [1])]) is not _generator([('map', _ + [1])])
+
+
+def test_lazy():
+    consumed = []
+    stream = Stream(consumed.append(i) or i for i in count()).map(_ * 2).filter(_ % 3 == 0).take(3)
+    assert consumed == []
+    assert stream.to_list() == [0, 6, 12]
+    assert consumed == list(range(7))
+    assert Stream(count()).filter(_ > 5).first() == 6
+    assert Stream([]).first(default=-1) == -1
+
+
+@mark.parametrize('stages, expected', [
+    (lambda s: s.take(4).map(-_), [0, -1, -2, -3]),
+    (lambda s: s.dropwhile(_ < 7).map(_ - 7), [0, 1, 2]),
+    (lambda s: s.map(If(_, _ % 2, None)).filter(_), [1, 3, 5, 7, 9]),
+    (lambda s: s.filter(Memo(_ % 3) == 0).take(2), [0, 3]),
+    (lambda s: s.take(0), []),
+    (lambda s: s.map(e(_ + 1)).filter(e(_ > 8, compile=True)).dropwhile(e(_ < 10)), [10]),
+])
+def test_stages(stages, expected):
+    assert list(stages(Stream(range(10)))) == expected
+
+
+def test_sorted():
+    assert Stream(['bb', 'a', 'ccc']).map(_.upper()).sorted(key=Len(_), reverse=True) == ['CCC', 'BB', 'A']
+    assert Stream([3, 1, 2]).sorted() == [1, 2, 3]
+
+
+def test_deep():
+    deep = _
+    for _i in range(10000):
+        deep = deep + 1
+    assert Stream(range(3)).map(deep).filter(_ > 10000).to_list() == [10001, 10002]
+
+
+def test_repr():
+    assert repr(Stream([1]).filter(_ > 1).take(2)) == 'Stream([1]).filter(_ > 1).take(2)'
+    with raises(ValueError):
+        Stream([1]).take(-1)
@@ -0,0 +1,36 @@
+from pytest import importorskip, raises
+
+from expressive import _, e, Abs, Floor, If, Pow, Not, And, Or
+
+np = importorskip('numpy')
+
+
+def test_vectorized():
+    arr = np.array([1.5, -2.5, 3.0, 0.0])
+    f = e(If(Floor(_), _ > 0, Abs(_) * 2) + Pow(_, 2))
+    assert np.array_equal(f.vectorized(arr), [f(x) for x in arr])
+
+
+def test_vectorized_columns():
+    columns = {'price': np.array([1, 5, 20]), 'qty': np.array([200, 10, 1])}
+    f = e(Not(_.price * _['qty'] > 100))
+    assert np.array_equal(f.vectorized(columns), [False, True, True])
+
+
+def test_array_ufunc():
+    ex = np.sqrt(_) + np.array([1, 2])
+    assert np.array_equal(e(ex)(np.array([4, 9])), [3, 5])
+    assert e(np.add.reduce(_))(np.array([1, 2, 3])) == 6
+
+
+def test_vectorized_too_deep():
+    ex = _
+    for i in range(500):
+        ex = ex + i
+    with raises(ValueError):
+        e(ex).vectorized(np.array([1, 2]))
+
+
+def test_vectorized_short_circuit():
+    arr = np.array([1, 5, 20])
+    assert np.array_equal(e(Or(_ < 2, And(_ > 4, _ < 10))).vectorized(arr), [True, True, False])